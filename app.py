@@ -1,15 +1,67 @@
+import argparse
+import os
+from contextlib import nullcontext
 from scripts.extract import extract_and_diff
 from scripts.update_cards import update_cards
 from scripts.update_banners import update_banners
 from scripts.update_events import update_events
+from scripts.reproject import reproject
 from scripts.cleanup import cleanup
+from scripts.pipeline import PipelineContext
+from scripts.metrics import MetricsRecorder
+from scripts.profiling import StageProfiler
 
-def main():
-    extract_and_diff("local")
-    update_cards()
-    update_banners()
-    update_events()
-    cleanup()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Update cards, banners and events from the master data")
+    parser.add_argument("--profile", action="store_true",
+                        help="run every stage under cProfile, writing pstats and collapsed stacks to data/profile")
+    parser.add_argument("--profile-top", type=int, metavar="N",
+                        help="print the N functions with the most own time (implies --profile)")
+    parser.add_argument("--reproject", action="store_true",
+                        help="recompute the pipeline's own future EN estimates from the JP data")
+    parser.add_argument("--reproject-dry-run", action="store_true",
+                        help="only report the EN estimates --reproject would change")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record peak memory per stage with tracemalloc (slows the run down several times)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = StageProfiler() if args.profile or args.profile_top else None
+
+    # COMPACT_BANNERS=1 also writes the pooled jp/en_banners.compact.json files next to the
+    # outputs, for local use: the updater workflow leaves them out of its commit
+    ctx = PipelineContext(compact=os.getenv("COMPACT_BANNERS") == "1")
+    stages = [
+        ("extract_and_diff", lambda: extract_and_diff("local", ctx)),
+        ("update_cards", lambda: update_cards(ctx)),
+        ("update_banners", lambda: update_banners(ctx)),
+        ("update_events", lambda: update_events(ctx)),
+        ("write", ctx.flush),
+    ]
+    if args.reproject or args.reproject_dry_run:
+        stages.insert(-1, ("reproject", lambda: reproject(ctx, dry_run=args.reproject_dry_run)))
+    with MetricsRecorder(trace_memory=args.trace_memory) as recorder:
+        try:
+            for name, run in stages:
+                with recorder.stage(name), (profiler.stage(name) if profiler else nullcontext()):
+                    run()
+        except BaseException:
+            # keep the snapshots where they were, the next run picks up the same diffs
+            ctx.discard_pending()
+            raise
+        cleanup()
+
+    recorder.write_report()
+    # METRICS_OPENMETRICS=<path> also exports the run in OpenMetrics text format
+    if os.getenv("METRICS_OPENMETRICS"):
+        recorder.write_openmetrics(os.getenv("METRICS_OPENMETRICS"))
+
+    if profiler:
+        profiler.write_collapsed()
+        if args.profile_top:
+            profiler.print_top(args.profile_top)
 
 if __name__ == "__main__":
     main()
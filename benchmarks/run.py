@@ -0,0 +1,230 @@
+"""Offline benchmarks of the pipeline hot paths on synthetic 1x/10x/100x data.
+
+    python -m benchmarks.run                      # all scales, results in benchmarks/results/
+    python -m benchmarks.run --scales 1 10 --repeat 5 --output results.json
+
+Network access and DeepL are stubbed. Apart from the results file, writes go to a
+temporary directory.
+"""
+import argparse
+import contextlib
+import io
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from scripts import fetch, json_codec, json_writer
+from scripts.common import get_json_differences
+from scripts.common_update import write_outputs
+from scripts.transformers import banner_transformer, cards_transformer, event_transformer
+from scripts.transformers.card_store import CardStore
+from scripts.transformers.translator import CardNameTranslator
+from .synthetic import generate, load_base
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+RESULTS_DIR = os.path.join(current_dir, "results")
+DEFAULT_SCALES = [1, 10, 100]
+# share of the newest master records treated as the upstream diff of a run
+DIFF_FRACTION = 0.02
+
+
+class FakeTranslationBackend:
+    """Stands in for DeepL, "translates" by tagging the text"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate_batch(self, texts: List[str], target_lang: str) -> List[str]:
+        self.calls += 1
+        return [f"[{target_lang}] {text}" for text in texts]
+
+
+def _no_network(url, *args, **kwargs):
+    raise RuntimeError(f"network access during benchmarks: {url}")
+
+
+@contextlib.contextmanager
+def offline(event_cards: List[Dict]):
+    """Block the fetch layer, serve eventCards from memory and swap DeepL for the fake backend"""
+    patches = [
+        (fetch, "fetch_json_with_stats", _no_network),
+        (event_transformer, "fetch_json_from_url", lambda url: event_cards),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    cards_transformer.set_translator(CardNameTranslator(FakeTranslationBackend(), cache_path=None))
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+        cards_transformer.set_translator(None)
+
+
+def _newest(records: List[Dict]) -> List[Dict]:
+    count = max(1, int(len(records) * DIFF_FRACTION))
+    return records[-count:]
+
+
+def _copies(records: List[Dict]) -> List[Dict]:
+    # the stages update records in place, give every run its own
+    return [dict(record) for record in records]
+
+
+def build_cases(data: Dict[str, List[Dict]], workdir: str) -> Dict[str, tuple]:
+    """name -> (setup, run, record count); setup() builds the arguments run() receives"""
+    card_diff = _newest(data["master_cards"])
+    gacha_diff = _newest(data["master_gachas"])
+    event_diff = _newest(data["master_events"])
+    old_cards = data["master_cards"][:-len(card_diff)]
+    old_events = data["master_events"][:-len(event_diff)]
+
+    def resolver():
+        return cards_transformer.EventCardResolver(
+            data["event_cards"], data["event_deck_bonuses"], data["master_events"], data["master_cards"])
+
+    def transformed_events():
+        return event_transformer.transform_events(event_diff, data["jp_events"], data["cards"], "jp")
+
+    cases = {
+        "get_json_differences[cards]": (
+            lambda: (old_cards, data["master_cards"]),
+            lambda old, new: get_json_differences(old, new, "cards"),
+            len(data["master_cards"])),
+        "get_json_differences[events]": (
+            lambda: (old_events, data["master_events"]),
+            lambda old, new: get_json_differences(old, new, "event"),
+            len(data["master_events"])),
+        "cards.transform_diff[jp]": (
+            lambda: (card_diff, resolver()),
+            lambda diff, card_resolver: cards_transformer.transform_diff(diff, "jp", card_resolver),
+            len(card_diff)),
+        "banners.transform_diff[en]": (
+            lambda: (gacha_diff, CardStore(data["cards"])),
+            lambda diff, store: banner_transformer.transform_diff(
+                diff, "en", data["jp_banners"], store, data["en_banners"]),
+            len(gacha_diff)),
+        "transform_events[en]": (
+            lambda: (event_diff,),
+            lambda diff: event_transformer.transform_events(diff, data["en_events"], data["cards"], "en"),
+            len(event_diff)),
+        "update_event_ids": (
+            lambda: (transformed_events(), _copies(data["jp_banners"])),
+            event_transformer.update_event_ids,
+            len(data["jp_banners"])),
+        "update_jp_banners_with_en_ids": (
+            lambda: (data["jp_banners"], data["en_banners"]),
+            banner_transformer.update_jp_banners_with_en_ids,
+            len(data["jp_banners"])),
+        "update_en_banners_from_en_source": (
+            lambda: (gacha_diff, _copies(data["en_banners"]), None, CardStore(data["cards"])),
+            banner_transformer.update_en_banners_from_en_source,
+            len(data["en_banners"])),
+        "json_writer.dumps[all outputs]": (
+            lambda: ([data[name] for name in ("cards", "jp_banners", "en_banners", "jp_events", "en_events")],),
+            lambda outputs: [json_writer.dumps(output) for output in outputs],
+            sum(len(data[name]) for name in ("cards", "jp_banners", "en_banners", "jp_events", "en_events"))),
+    }
+
+    def encoded_outputs():
+        return ([json_writer.dumps(data[name]).encode("utf-8")
+                 for name in ("cards", "jp_banners", "en_banners", "jp_events", "en_events")],)
+
+    cases[f"json_codec.loads[all outputs, {json_codec.BACKEND}]"] = (
+        encoded_outputs,
+        lambda bodies: [json_codec.loads(body) for body in bodies],
+        cases["json_writer.dumps[all outputs]"][2])
+
+    def write_setup():
+        directory = tempfile.mkdtemp(dir=workdir)
+        outputs = {os.path.join(directory, f"{name}.json"): data[name]
+                   for name in ("cards", "jp_banners", "en_banners", "jp_events", "en_events")}
+        write_outputs(outputs)
+        # second write of the same data, which the write-if-changed layer should skip
+        return (outputs,)
+
+    cases["write_outputs[unchanged]"] = (write_setup, write_outputs, cases["json_writer.dumps[all outputs]"][2])
+    return cases
+
+
+def time_case(setup: Callable, run: Callable, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        # the stages print progress, keep it out of the timings and the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            args = setup()
+            started = time.perf_counter()
+            run(*args)
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=parent_dir,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales: List[int], repeat: int, only: Optional[List[str]] = None) -> Dict:
+    base = load_base()
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started_at": int(time.time()),
+        "repeat": repeat,
+        "results": [],
+    }
+    for scale in scales:
+        started = time.perf_counter()
+        data = generate(scale, base)
+        print(f"Generated {scale}x dataset in {time.perf_counter() - started:.2f}s: "
+              f"{len(data['cards'])} cards, {len(data['jp_banners'])} JP banners, {len(data['jp_events'])} JP events")
+
+        with offline(data["event_cards"]), tempfile.TemporaryDirectory() as workdir:
+            for name, (setup, run, records) in build_cases(data, workdir).items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                timings = time_case(setup, run, repeat)
+                report["results"].append({
+                    "scale": scale,
+                    "benchmark": name,
+                    "records": records,
+                    "best_s": min(timings),
+                    "mean_s": sum(timings) / len(timings),
+                    "runs_s": timings,
+                })
+                print(f"  {name:<36} {records:>9} records  best {min(timings) * 1000:10.2f} ms")
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline hot paths on synthetic data")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<revision>.json)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.scales, args.repeat, args.only)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{(report['revision'] or 'unknown')[:12]}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json_codec.dump(report, f)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import os
+from typing import Dict, List
+from scripts import json_codec
+
+# Synthetic datasets for the benchmarks, built by tiling the data in the repo.
+# Copy k of every record gets its ids shifted by k strides, so references between
+# files (card ids in banners and eventCards, event ids, sekai ids) stay consistent.
+# Timestamps are shifted by k/scale of the current timeline, so a 100x dataset is
+# denser rather than 600 years long and projected dates stay in range.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+# field -> kind of id (or "time") it holds, per file
+SCHEMAS = {
+    "cards": {"id": "card", "jp_released": "time", "en_released": "time"},
+    "jp_banners": {"id": "jp_banner", "en_id": "en_banner", "event_id": "event", "sekai_id": "gacha",
+                   "cards": "card", "gachaDetails": "card", "start": "time", "end": "time"},
+    "en_banners": {"id": "en_banner", "en_id": "en_banner", "event_id": "event", "sekai_id": "gacha",
+                   "cards": "card", "gachaDetails": "card", "start": "time", "end": "time", "rerun": "time"},
+    "jp_events": {"id": "event", "banner_id": "jp_banner", "cards": "card",
+                  "start": "time", "end": "time", "close": "time"},
+    "en_events": {"id": "event", "banner_id": "en_banner", "cards": "card",
+                  "start": "time", "end": "time", "close": "time"},
+    "master_cards": {"id": "card", "releaseAt": "time"},
+    "master_gachas": {"id": "gacha", "startAt": "time", "endAt": "time",
+                      "gachaPickups": "card", "gachaDetails": "card"},
+    "master_events": {"id": "event", "startAt": "time", "aggregateAt": "time", "closedAt": "time"},
+    "event_cards": {"id": "event_card", "cardId": "card", "eventId": "event"},
+    "event_deck_bonuses": {"id": "event_deck_bonus", "eventId": "event"},
+}
+
+
+def _load(path: str) -> List[Dict]:
+    return json_codec.load_path(os.path.join(parent_dir, path))
+
+
+def _master_gachas(jp_banners: List[Dict]) -> List[Dict]:
+    """gachas.json records rebuilt from the JP output, pickups and details as {cardId} objects"""
+    return [{
+        "id": banner["sekai_id"],
+        "name": banner["name"],
+        "startAt": banner["start"],
+        "endAt": banner["end"],
+        "gachaPickups": [{"cardId": card_id} for card_id in banner.get("cards", [])],
+        "gachaDetails": [{"cardId": card_id} for card_id in banner.get("gachaDetails", []) + banner.get("cards", [])],
+    } for banner in jp_banners]
+
+
+def _event_deck_bonuses(event_cards: List[Dict], master_cards: List[Dict]) -> List[Dict]:
+    character_by_card = {card["id"]: card.get("characterId") for card in master_cards}
+    bonuses = []
+    for event_card in event_cards:
+        bonuses.append({
+            "id": len(bonuses) + 1,
+            "eventId": event_card["eventId"],
+            "gameCharacterUnitId": character_by_card.get(event_card["cardId"], 1),
+            "bonusRate": 50.0,
+        })
+    return bonuses
+
+
+def load_base() -> Dict[str, List[Dict]]:
+    """The 1x dataset: output files, extracted master snapshots and eventCards"""
+    base = {
+        "cards": _load("cards.json"),
+        "jp_banners": _load("jp_banners.json"),
+        "en_banners": _load("en_banners.json"),
+        "jp_events": _load("jp_events.json"),
+        "en_events": _load("en_events.json"),
+        "master_cards": _load(os.path.join("data", "extracted", "jp_cards_extracted.json")),
+        "master_events": _load(os.path.join("data", "extracted", "jp_events_extracted.json")),
+        "event_cards": _load(os.path.join("data", "master", "event_cards_orig.json")),
+    }
+    base["master_gachas"] = _master_gachas(base["jp_banners"])
+    base["event_deck_bonuses"] = _event_deck_bonuses(base["event_cards"], base["master_cards"])
+    return base
+
+
+def _strides(base: Dict[str, List[Dict]], scale: int) -> Dict[str, int]:
+    highest: Dict[str, int] = {}
+    for name, records in base.items():
+        for field, kind in SCHEMAS[name].items():
+            for record in records:
+                value = record.get(field)
+                values = value if isinstance(value, list) else [value]
+                for item in values:
+                    if isinstance(item, dict):
+                        item = item.get("cardId")
+                    if not isinstance(item, int) or not item:
+                        continue
+                    highest[kind] = max(highest.get(kind, 0), item)
+    strides = {kind: value + 1 for kind, value in highest.items() if kind != "time"}
+    # span of the card release timeline, other times include sentinels such as 2099-12-31
+    releases = [card["releaseAt"] for card in base["master_cards"] if card.get("releaseAt")]
+    strides["time"] = (max(releases) - min(releases)) // scale
+    return strides
+
+
+def _shifted_item(item, offset: int):
+    if isinstance(item, dict):
+        # gachaPickups / gachaDetails entries
+        return {**item, "cardId": item["cardId"] + offset}
+    if isinstance(item, int) and item:
+        return item + offset
+    return item
+
+
+def _shifted(record: Dict, schema: Dict[str, str], offsets: Dict[str, int]) -> Dict:
+    copy = dict(record)
+    for field, kind in schema.items():
+        value = copy.get(field)
+        offset = offsets.get(kind, 0)
+        if isinstance(value, list):
+            copy[field] = [_shifted_item(item, offset) for item in value]
+        elif isinstance(value, int) and not isinstance(value, bool) and value:
+            copy[field] = value + offset
+    return copy
+
+
+def generate(scale: int, base: Dict[str, List[Dict]] = None) -> Dict[str, List[Dict]]:
+    """Dataset with `scale` copies of the base data laid end to end on the timeline"""
+    base = base or load_base()
+    if scale == 1:
+        return base
+    strides = _strides(base, scale)
+    dataset = {}
+    for name, records in base.items():
+        schema = SCHEMAS[name]
+        tiled = []
+        for copy_index in range(scale):
+            offsets = {kind: stride * copy_index for kind, stride in strides.items()}
+            tiled.extend(_shifted(record, schema, offsets) for record in records)
+        dataset[name] = tiled
+    return dataset
@@ -0,0 +1,180 @@
+import hashlib
+import marshal
+import os
+from typing import Any, List, Optional
+from . import json_codec, metrics
+from .common_update import load_optional_json, write_json_if_changed
+
+# Append-only updates of the output files that grow at the tail (cards, JP events,
+# JP banners): new records are written over the closing bracket instead of
+# re-encoding the whole file. This saves encoding and write volume only, the
+# pipeline still parses and fingerprints the whole file when it loads it, and the
+# tail reader merely checks that the file ends where the loaded data does.
+#
+# A file is only appended to while it still holds exactly what the pipeline last
+# wrote, i.e. json_writer's layout, checked by size and sha1 against LAYOUT_FILE.
+# data/cache is restored between CI runs, so a layout record may be older than the
+# checkout; comparing content rather than mtimes makes such a record harmless.
+#
+# Appending in place is not atomic, so every append is journaled in JOURNAL_FILE
+# first. recover_append finishes or rolls back an append that was interrupted.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+LAYOUT_FILE = os.path.join(parent_dir, "data", "cache", "append_layout.json")
+JOURNAL_FILE = os.path.join(parent_dir, "data", "cache", "append_journal.json")
+TAIL_CHUNK_SIZE = 4096
+# what json_writer ends every array of records with
+ARRAY_END = b"\n]\n"
+_WHITESPACE = " \t\n\r"
+
+
+def fingerprint(records: List[Any]) -> Optional[bytes]:
+    """Content and key order of records, None if they are not plain JSON data"""
+    try:
+        # version 2 has no back-references, so equal data always gives equal bytes
+        return marshal.dumps(records, 2)
+    except ValueError:
+        return None
+
+
+def _sha1(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _update_entry(cache_path: str, path: str, entry: Optional[list]):
+    entries = load_optional_json(cache_path, {})
+    key = os.path.abspath(path)
+    if entry is None:
+        if key not in entries:
+            return
+        del entries[key]
+    else:
+        entries[key] = entry
+    write_json_if_changed(cache_path, entries)
+
+
+def remember_layout(path: str, content: Optional[bytes] = None):
+    """Record that path was just written by json_writer, content is what it holds if already known"""
+    if content is None:
+        content = _read(path)
+    _update_entry(LAYOUT_FILE, path, [len(content), _sha1(content)])
+
+
+def _matches_layout(path: str, content: Optional[bytes]) -> bool:
+    layout = load_optional_json(LAYOUT_FILE, {}).get(os.path.abspath(path))
+    if content is None or not layout or layout[0] != len(content):
+        return False
+    return layout[1] == _sha1(content)
+
+
+def has_writer_layout(path: str) -> bool:
+    """Whether path still holds what the pipeline last wrote to it"""
+    return _matches_layout(path, _read(path))
+
+
+def recover_append(path: str) -> bool:
+    """Finish or roll back an interrupted append to path.
+
+    Returns True if path was rolled back to its content before the append.
+    """
+    entry = load_optional_json(JOURNAL_FILE, {}).get(os.path.abspath(path))
+    if not entry:
+        return False
+    size, digest, final_size, final_digest = entry
+    content = _read(path)
+    # the append never touches the bytes before the original closing bracket
+    prefix = size - len(ARRAY_END)
+    rolled_back = False
+    if content is None or (len(content) == final_size and _sha1(content) == final_digest):
+        pass
+    elif len(content) >= prefix and _sha1(content[:prefix] + ARRAY_END) == digest:
+        with open(path, "r+b") as f:
+            f.seek(prefix)
+            f.write(ARRAY_END)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        rolled_back = True
+        print(f"Rolled back an interrupted append to {path}")
+        metrics.count("appends_rolled_back")
+    # anything else was rewritten since, e.g. a journal restored with data/cache onto a fresh checkout
+    _update_entry(JOURNAL_FILE, path, None)
+    return rolled_back
+
+
+def read_tail_record(path: str, chunk_size: int = TAIL_CHUNK_SIZE) -> Optional[Any]:
+    """Last item of the JSON array in path, found by scanning backwards from the end of the file"""
+    size = os.path.getsize(path)
+    read_size = chunk_size
+    while True:
+        start = max(0, size - read_size)
+        with open(path, "rb") as f:
+            f.seek(start)
+            # a multi-byte character cut at the start of the chunk only garbles text before any candidate
+            text = f.read().decode("utf-8", errors="replace")
+        end = len(text.rstrip())
+        if not text[:end].endswith("]"):
+            raise ValueError(f"{path} does not end with a JSON array")
+        end -= 1
+        pos = text.rfind("{", 0, end)
+        while pos != -1:
+            before = pos - 1
+            while before >= 0 and text[before] in _WHITESPACE:
+                before -= 1
+            # a top-level record follows "[" or ",", nested objects only match if they close right before "]"
+            if before >= 0 and text[before] in ",[":
+                try:
+                    record, record_end = json_codec.raw_decode(text, pos)
+                except ValueError:
+                    record_end = -1
+                if record_end != -1 and not text[record_end:end].strip():
+                    return record
+            pos = text.rfind("{", 0, pos)
+        if start == 0:
+            return None
+        read_size *= 2
+
+
+def _write_tail(path: str, offset: int, content: bytes):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(content)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_records(path: str, records: List[Any], expected_tail: Any, indent: int = 2) -> bool:
+    """Append records to the array in path in place, before its closing bracket.
+
+    Only done if the file still has the pipeline's layout and ends with expected_tail,
+    returns False without touching the file otherwise.
+    """
+    if not records:
+        return False
+    original = _read(path)
+    if not _matches_layout(path, original) or not original.endswith(ARRAY_END):
+        return False
+    if read_tail_record(path) != expected_tail:
+        return False
+    # "[\n  {...},\n  {...}\n]\n" -> ",\n  {...},\n  {...}\n]\n" continues the existing array
+    content = ("," + json_codec.dumps(records, indent)[1:]).encode("utf-8")
+    offset = len(original) - len(ARRAY_END)
+    final = original[:offset] + content
+    _update_entry(JOURNAL_FILE, path, [len(original), _sha1(original), len(final), _sha1(final)])
+    _write_tail(path, offset, content)
+    remember_layout(path, final)
+    _update_entry(JOURNAL_FILE, path, None)
+    metrics.count("files_appended")
+    metrics.count("bytes_written", len(content))
+    return True
@@ -1,6 +1,56 @@
-import json
-from typing import List, Dict, Any
-import requests
+import hashlib
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from . import json_codec
+from .json_stream import project_records
+
+
+_MISSING = object()
+
+
+class UnorderedInput(ValueError):
+    """A record stream given to merge_diff is not sorted by its key"""
+
+
+def _keyed(records: Iterable[Dict[str, Any]], key: str, side: str) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+    previous = _MISSING
+    for obj in records:
+        obj_key = obj[key]
+        try:
+            ordered = previous is _MISSING or previous < obj_key
+        except TypeError:
+            ordered = False
+        if not ordered:
+            raise UnorderedInput(f"{side} records are not sorted by {key!r}: {obj_key!r} after {previous!r}")
+        previous = obj_key
+        yield obj_key, obj
+
+
+def merge_diff(
+    old_data: Iterable[Dict[str, Any]],
+    new_data: Iterable[Dict[str, Any]],
+    key: str = "id"
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """Merge-join two streams of records sorted by key, holding one record of each at a time.
+
+    Yields ("insert", None, new), ("update", old, new), ("delete", old, None) or
+    ("same", old, new) in key order. Raises UnorderedInput as soon as either stream
+    goes out of order, possibly after some changes were yielded.
+    """
+    old_iter = _keyed(old_data, key, "old")
+    new_iter = _keyed(new_data, key, "new")
+    old_item = next(old_iter, None)
+    new_item = next(new_iter, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield "delete", old_item[1], None
+            old_item = next(old_iter, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield "insert", None, new_item[1]
+            new_item = next(new_iter, None)
+        else:
+            yield ("same" if old_item[1] == new_item[1] else "update"), old_item[1], new_item[1]
+            old_item = next(old_iter, None)
+            new_item = next(new_iter, None)
 
 
 def get_json_differences(
@@ -9,52 +59,74 @@ def get_json_differences(
     mode: str = None,
     key: str = "id"
 ) -> List[Dict[str, Any]]:
-
-    if mode == "cards":
-        if not old_data:
-            return new_data
-        max_old_id = old_data[-1][key]
-        return [obj for obj in new_data if obj[key] > max_old_id]
-    else:
+    """Records of new_data whose key is not in old_data"""
+    try:
+        return [new for change, _, new in merge_diff(old_data, new_data, key) if change == "insert"]
+    except UnorderedInput:
         old_keys = {obj[key] for obj in old_data}
         return [obj for obj in new_data if obj[key] not in old_keys]
 
-def save_json_pretty_inline_arrays(data, file_path):
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write("[\n")
-        for i, obj in enumerate(data):
-            obj_copy = obj.copy()
-            # Convert lists to inline strings
-            for key, value in obj.items():
-                if isinstance(value, list):
-                    obj_copy[key] = json.dumps(value, ensure_ascii=False)
-            # Dump the object with indent for top-level keys
-            obj_str = json.dumps(obj_copy, ensure_ascii=False, indent=1)
-
-            for key, value in obj_copy.items():
-                if isinstance(obj[key], list):
-                    obj_str = obj_str.replace(f'"{value}"', value)
-            # Add comma if not last object
-            if i < len(data) - 1:
-                obj_str += ","
-            f.write(obj_str + "\n")
-        f.write("]\n")
+def content_hash(record: Dict[str, Any]) -> str:
+    """Stable hash of a record's content, independent of key order"""
+    return hashlib.sha1(json_codec.canonical(record).encode("utf-8")).hexdigest()
 
 
-def extract_keys_by_mode(json_array: List[Dict[str, Any]], mode: str) -> List[Dict[str, Any]]:
-    mode_keys = {
-        "cards": ["id", "characterId", "attr", "cardRarityType", "cardSupplyId", "prefix", "releaseAt"],
-        "banner": ["id", "name", "endAt", "startAt", "gachaPickups", "gachaDetails"],
-        "event": ["id", "unit", "eventType", "name", "startAt", "aggregateAt", "closedAt"],
-    }
+def build_hash_index(data: List[Dict[str, Any]], key: str = "id") -> Dict[str, str]:
+    return {str(obj[key]): content_hash(obj) for obj in data}
 
 
-    keys_to_keep = mode_keys.get(mode)
-    if not keys_to_keep:
-        raise ValueError(f"No keys defined for mode '{mode}'")
+def diff_by_content_hash(
+    old_hashes: Dict[str, str],
+    new_data: Iterable[Dict[str, Any]],
+    key: str = "id"
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str], Dict[str, str]]:
+    """Split new_data into added and modified records in one pass.
+
+    Returns (added, modified, removed ids, new hash index).
+    """
+    added = []
+    modified = []
+    new_hashes = {}
+    for obj in new_data:
+        obj_key = str(obj[key])
+        obj_hash = content_hash(obj)
+        new_hashes[obj_key] = obj_hash
+        old_hash = old_hashes.get(obj_key)
+        if old_hash is None:
+            added.append(obj)
+        elif old_hash != obj_hash:
+            modified.append(obj)
+    removed = [obj_key for obj_key in old_hashes if obj_key not in new_hashes]
+    return added, modified, removed, new_hashes
+
+
+def apply_changes(
+    snapshot: List[Dict[str, Any]],
+    added: List[Dict[str, Any]],
+    modified: List[Dict[str, Any]],
+    removed: List[str],
+    key: str = "id"
+) -> List[Dict[str, Any]]:
+    """Patch a snapshot with the output of diff_by_content_hash, keeping its order"""
+    replacements = {str(obj[key]): obj for obj in modified}
+    removed_keys = set(removed)
+    patched = []
+    for obj in snapshot:
+        obj_key = str(obj[key])
+        if obj_key in removed_keys:
+            continue
+        patched.append(replacements.get(obj_key, obj))
+    patched.extend(added)
+    return patched
 
 
-    return [{k: obj[k] for k in keys_to_keep if k in obj} for obj in json_array]
+def save_json_pretty_inline_arrays(data, file_path):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json_codec.dump(data, f, indent=1)
+
+
+def extract_keys_by_mode(json_array: List[Dict[str, Any]], mode: str) -> List[Dict[str, Any]]:
+    return list(project_records(json_array, mode))
 
 def extract_keys_by_mode_debug(json_array: List[Dict[str, Any]], mode: str) -> List[Dict[str, Any]]:
     mode_keys = {
@@ -95,16 +167,8 @@ def extract_keys_by_mode_debug(json_array: List[Dict[str, Any]], mode: str) -> L
     print(f"Extracted {len(result)} objects")
     return result
 def load_json(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return json_codec.load_path(path)
 
 def save_json(path, data):
     with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-
-def fetch_json_from_url(url: str) -> Dict:
-    """Fetch JSON data from URL"""
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
\ No newline at end of file
+        json_codec.dump(data, f, indent=4)
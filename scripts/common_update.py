@@ -1,17 +1,234 @@
-import json
+import hashlib
+import marshal
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+from . import json_codec, metrics
 
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+PARSED_CACHE_DIR = os.path.join(parent_dir, "data", "cache", "parsed")
+# bump when the layout of cache entries changes
+PARSED_CACHE_VERSION = 1
+# coarsest file timestamp granularity to expect (FAT keeps 2 s): a file changed again within
+# this long of being cached can still show the cached mtime
+MTIME_RESOLUTION_NS = 2 * 10 ** 9
+
+
+def _parsed_cache_path(abspath: str) -> str:
+    key = hashlib.sha1(abspath.encode("utf-8")).hexdigest()
+    return os.path.join(PARSED_CACHE_DIR, f"{key}.marshal")
+
+
+def _write_parsed_cache(cache_path: str, header: tuple, data: Any):
+    """Entry = marshalled ((version, path, size, mtime_ns, sha1), data)"""
+    try:
+        content = marshal.dumps((header, data))
+    except ValueError:
+        # not plain JSON data, nothing to cache
+        return
+    try:
+        os.makedirs(PARSED_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PARSED_CACHE_DIR, prefix=".tmp-")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _load_parsed(path: str, stat: os.stat_result) -> Any:
+    """Parsed content of path, from the cache while the file is unchanged"""
+    abspath = os.path.abspath(path)
+    cache_path = _parsed_cache_path(abspath)
+    key = (PARSED_CACHE_VERSION, abspath, stat.st_size)
+    content = None
+    try:
+        # one read, marshal.load on a file object reads it in tiny pieces
+        with open(cache_path, "rb") as f:
+            cached_ns = os.fstat(f.fileno()).st_mtime_ns
+            header, data = marshal.loads(f.read())
+        if header[:3] == key:
+            # the entry's own mtime is when it was written, on the same clock as the file's
+            if header[3] == stat.st_mtime_ns and cached_ns - stat.st_mtime_ns > MTIME_RESOLUTION_NS:
+                metrics.count("parsed_cache_hits")
+                return data
+            # touched, e.g. by a checkout, or cached too soon after a write to trust
+            # the mtime: only the content tells whether it changed
+            with open(path, "rb") as source:
+                content = source.read()
+            if header[4] == hashlib.sha1(content).hexdigest():
+                _write_parsed_cache(cache_path, key + (stat.st_mtime_ns, header[4]), data)
+                metrics.count("parsed_cache_hits")
+                return data
+    except (OSError, EOFError, ValueError, TypeError, IndexError):
+        # missing or unreadable entry, parse the file
+        pass
+
+    if content is None:
+        with open(path, "rb") as source:
+            content = source.read()
+    data = json_codec.loads(content)
+    metrics.count("parsed_cache_misses")
+    _write_parsed_cache(cache_path, key + (stat.st_mtime_ns, hashlib.sha1(content).hexdigest()), data)
+    return data
+
+
+@metrics.timed()
 def load_json(path,fallback_value=None):
+    """Parsed JSON file, cached in binary form under data/cache/parsed until the file changes"""
     if fallback_value is None:
         fallback_value = []
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _load_parsed(path, os.stat(path))
     except FileNotFoundError:
         print(f"File not found: {path}, returning fallback value")
         return fallback_value
 
+def load_optional_json(path, default):
+    """Parsed JSON of a file the pipeline rebuilds when it is absent (caches, hash indexes).
+
+    Returns default without logging if the file is missing or unreadable.
+    """
+    try:
+        return json_codec.load_path(path)
+    except (FileNotFoundError, ValueError):
+        return default
+
 def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    write_json_if_changed(path, data, indent=4)
+
+
+@metrics.timed()
+def serialize_json(data, indent=2) -> bytes:
+    return json_codec.encode(data, indent)
+
+
+# read once, os.umask can only be queried by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path) -> int:
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def write_bytes_if_changed(path, content: bytes) -> bool:
+    """Atomically replace path with content unless it already holds the same bytes.
+
+    Returns True if the file was written.
+    """
+    try:
+        if os.path.getsize(path) == len(content):
+            with open(path, "rb") as f:
+                if hashlib.sha256(f.read()).digest() == hashlib.sha256(content).digest():
+                    metrics.count("files_unchanged")
+                    return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # temp file in the same directory so the rename stays on one filesystem
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files, give the output the usual permissions
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    metrics.count("files_written")
+    metrics.count("bytes_written", len(content))
+    return True
+
+
+def stage_json_array(path, records: Iterable, indent=2, keep: Optional[Callable[[], bool]] = None) -> Optional[str]:
+    """Stream records into a JSON array in a temp file next to path, ready for commit_staged.
+
+    keep() is asked once every record is written; if it returns False the temp file is
+    dropped and None returned.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json_codec.dump_array(records, f, indent)
+            kept = keep is None or keep()
+            if kept:
+                f.flush()
+                os.fsync(f.fileno())
+        if not kept:
+            os.unlink(tmp_path)
+            return None
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+
+def commit_staged(tmp_path, path):
+    """Move a file staged by stage_json_array over path"""
+    size = os.path.getsize(tmp_path)
+    os.chmod(tmp_path, _file_mode(path))
+    os.replace(tmp_path, path)
+    metrics.count("files_written")
+    metrics.count("bytes_written", size)
+
+
+def discard_staged(tmp_path):
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+
+
+def write_json_array_atomic(path, records: Iterable, indent=2, keep: Optional[Callable[[], bool]] = None) -> bool:
+    """Stream records into a JSON array next to path, then move it over path.
+
+    keep() is asked once every record is written; if it returns False the new file is
+    dropped and path is left as it was. Returns True if path was replaced.
+    """
+    tmp_path = stage_json_array(path, records, indent, keep)
+    if tmp_path is None:
+        return False
+    try:
+        commit_staged(tmp_path, path)
+    except BaseException:
+        discard_staged(tmp_path)
+        raise
+    return True
+
+
+def write_json_if_changed(path, data, indent=2) -> bool:
+    return write_bytes_if_changed(path, serialize_json(data, indent))
+
+
+def write_outputs(outputs: Dict[str, Any], indent=2) -> Dict[str, bool]:
+    """Serialize several independent files, then write them in parallel.
 
+    Encoding holds the GIL, so it runs here one file after another; only the
+    compare/fsync/replace part, which waits on the disk, goes to the threads.
+    Returns {path: written} where written is False for files that were already up to date.
+    """
+    if not outputs:
+        return {}
+    contents = {path: serialize_json(data, indent) for path, data in outputs.items()}
+    with ThreadPoolExecutor(max_workers=len(contents)) as pool:
+        futures = {path: pool.submit(write_bytes_if_changed, path, content)
+                   for path, content in contents.items()}
+        return {path: future.result() for path, future in futures.items()}
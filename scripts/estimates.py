@@ -0,0 +1,60 @@
+import os
+from typing import Any, Dict, Iterable, List
+from .common_update import load_optional_json, write_json_if_changed
+
+# Ledger of the EN times the pipeline estimated from JP data, per output file and
+# record key. reproject only recomputes entries still holding exactly the recorded
+# values: anything the EN update path or a person changed since is left alone.
+# Losing the ledger (it lives in data/cache) only means nothing gets re-projected.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+ESTIMATES_FILE = os.path.join(parent_dir, "data", "cache", "en_estimates.json")
+
+# output file -> (record key, estimated fields); banners are keyed by their own id,
+# a rerun estimate shares the sekai_id of the banner it reruns
+ESTIMATED_FIELDS = {
+    "cards": ("id", ("en_released",)),
+    "en_events": ("id", ("start", "end", "close")),
+    "en_banners": ("id", ("start", "end", "rerun")),
+}
+
+
+def load_estimates() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    return load_optional_json(ESTIMATES_FILE, {})
+
+
+def save_estimates(estimates: Dict[str, Dict[str, Dict[str, Any]]]):
+    write_json_if_changed(ESTIMATES_FILE, estimates)
+
+
+def estimated_values(name: str, record: Dict) -> Dict[str, Any]:
+    _, fields = ESTIMATED_FIELDS[name]
+    return {field: record[field] for field in fields if field in record}
+
+
+def matches_estimate(name: str, record: Dict, recorded: Dict[str, Any]) -> bool:
+    """Whether record still holds the estimated values, i.e. nobody has changed them since"""
+    return estimated_values(name, record) == recorded
+
+
+def remember_estimates(name: str, records: List[Dict]):
+    """Record the EN times of records the pipeline just estimated from JP data"""
+    if not records:
+        return
+    key, _ = ESTIMATED_FIELDS[name]
+    estimates = load_estimates()
+    entries = estimates.setdefault(name, {})
+    for record in records:
+        entries[str(record.get(key))] = estimated_values(name, record)
+    save_estimates(estimates)
+
+
+def forget_estimates(name: str, keys: Iterable[Any]):
+    """Drop the entries of records whose EN times now come from the EN master data"""
+    estimates = load_estimates()
+    entries = estimates.get(name, {})
+    dropped = [entries.pop(str(key)) for key in keys if str(key) in entries]
+    if dropped:
+        save_estimates(estimates)
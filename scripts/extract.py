@@ -1,9 +1,26 @@
+import hashlib
 import os
-from .common import get_json_differences, fetch_json_from_url, extract_keys_by_mode
-from .common_update import  load_json, save_json
+import time
+from functools import partial
+from .common import (extract_keys_by_mode, diff_by_content_hash, build_hash_index, apply_changes,
+                     merge_diff, UnorderedInput)
+from .fetch import fetch_all
+from .json_stream import iter_array, projector, stream_extract_bytes, stream_extract_file
+from . import metrics
+from .common_update import  (load_json, load_optional_json, save_json, stage_json_array, commit_staged, discard_staged,
+                             write_json_if_changed, PARSED_CACHE_DIR)
 
+DIFF_STAMPS_FILE = os.path.join(PARSED_CACHE_DIR, "diff_stamps.json")
 
-def extract_and_diff(mode):
+
+def extract_and_diff(mode, ctx=None):
+    """Extract upstream master data and diff it against the stored snapshots.
+
+    Diffs are handed to ctx (a PipelineContext) when given, otherwise written to data/diff.
+    With ctx the snapshots and diff stamps are only updated by ctx.flush(), once the
+    outputs built from the diffs are written; a run failing before that leaves them as
+    they were, so the next run finds the same changes again.
+    """
     current_dir = os.path.dirname(os.path.abspath(__file__))
     parent_dir = os.path.dirname(current_dir)
     data_dir = os.path.join(parent_dir,"data")
@@ -30,89 +47,265 @@ def extract_and_diff(mode):
     jp_events_extracted = os.path.join(extracted_dir, "jp_events_extracted.json")
     en_events_extracted = os.path.join(extracted_dir, "en_events_extracted.json")
 
-    if mode=="sekai":
-        jp_cards_sekai = fetch_json_from_url(jp_cards_url)
-        en_cards_sekai = fetch_json_from_url(en_cards_url)
-        jp_banners_sekai = fetch_json_from_url(jp_banners_url)
-        en_banners_sekai = fetch_json_from_url(en_banners_url)
-        jp_events_sekai = fetch_json_from_url(jp_events_url)
-        en_events_sekai = fetch_json_from_url(en_events_url)
-
-        jp_cards_extracted_sekai = extract_keys_by_mode(jp_cards_sekai, "cards")
-        en_cards_extracted_sekai = extract_keys_by_mode(en_cards_sekai,"cards")
-        jp_banners_extracted_sekai = extract_keys_by_mode(jp_banners_sekai,"banner")
-        en_banners_extracted_sekai = extract_keys_by_mode(en_banners_sekai,"banner")
-        jp_events_extracted_sekai = extract_keys_by_mode(jp_events_sekai,"event")
-        en_events_extracted_sekai = extract_keys_by_mode(en_events_sekai,"event")
-        
-        jp_cards_diff = get_json_differences(load_json(jp_cards_extracted), jp_cards_extracted_sekai, "cards")
-        en_cards_diff = get_json_differences(load_json(en_cards_extracted),en_cards_extracted_sekai, "cards")
-        jp_banners_diff = get_json_differences(load_json(jp_banners_extracted),jp_banners_extracted_sekai)
-        en_banners_diff = get_json_differences(load_json(en_banners_extracted),en_banners_extracted_sekai)
-        jp_events_diff = get_json_differences(load_json(jp_events_extracted),jp_events_extracted_sekai)
-        en_events_diff = get_json_differences(load_json(en_events_extracted),en_events_extracted_sekai)
-
-        diffs = [
-            (jp_cards_diff, "jp_cards_diff.json", jp_cards_extracted_sekai, jp_cards_extracted, "jp_cards"),
-            (en_cards_diff, "en_cards_diff.json", en_cards_extracted_sekai, en_cards_extracted, "en_cards"),
-            (jp_banners_diff, "jp_banners_diff.json", jp_banners_extracted_sekai, jp_banners_extracted, "jp_banners"),
-            (en_banners_diff, "en_banners_diff.json", en_banners_extracted_sekai, en_banners_extracted, "en_banners"),
-            (jp_events_diff, "jp_events_diff.json", jp_events_extracted_sekai, jp_events_extracted, "jp_events"),
-            (en_events_diff, "en_events_diff.json", en_events_extracted_sekai, en_events_extracted, "en_events")
-        ]
-
-        os.makedirs(diff_dir, exist_ok=True)
-
-        files_with_diffs = []
-
-        for diff, filename, extracted_new, extracted_path, file_type in diffs:
-            if len(diff) > 0:
-                save_json(os.path.join(diff_dir, filename), diff)
-                save_json(extracted_path, extracted_new)
-                files_with_diffs.append(file_type)
-
-        if files_with_diffs:
-            print(f"Files with differences: {', '.join(files_with_diffs)}")
+    snapshots = {
+        "jp_cards": jp_cards_extracted,
+        "en_cards": en_cards_extracted,
+        "jp_banners": jp_banners_extracted,
+        "en_banners": en_banners_extracted,
+        "jp_events": jp_events_extracted,
+        "en_events": en_events_extracted,
+    }
+
+    os.makedirs(diff_dir, exist_ok=True)
+
+    files_with_diffs = []
+    # (commit, discard) pairs of the snapshot and stamp updates, run once everything was diffed
+    pending = []
+
+    try:
+        # records are parsed and projected lazily while diff_snapshot merges them into the snapshot
+        if mode=="sekai":
+            sources = {
+                jp_cards_url: ("jp_cards", "cards"),
+                en_cards_url: ("en_cards", "cards"),
+                jp_banners_url: ("jp_banners", "banner"),
+                en_banners_url: ("en_banners", "banner"),
+                jp_events_url: ("jp_events", "event"),
+                en_events_url: ("en_events", "event"),
+            }
+
+            # every download has to succeed before any snapshot is replaced, otherwise a failed
+            # fetch would leave some snapshots ahead of the outputs and their changes would be lost
+            started = time.perf_counter()
+            results = {}
+            for result in fetch_all(list(sources), parse=False):
+                file_type, _ = sources[result.url]
+                print(f"Fetched {file_type}: HTTP {result.status}, {result.size} bytes in {result.elapsed:.2f}s")
+                results[result.url] = result
+            print(f"Fetched {len(sources)} files in {time.perf_counter() - started:.2f}s")
+
+            # [ETag/Last-Modified, snapshot content] after the last diff of each file, a 304 for
+            # the same validator means the snapshot already holds exactly that body
+            stamps = load_optional_json(DIFF_STAMPS_FILE, {})
+            validators = {}
+            for url, (file_type, extract_mode) in sources.items():
+                result = results[url]
+                key = f"sekai/{file_type}"
+                if (result.status == 304 and result.validator
+                        and stamps.get(key) == [result.validator, _content_stamp(snapshots[file_type])]):
+                    print(f"{file_type}: not modified upstream since the last diff")
+                    metrics.count("diffs_skipped")
+                    continue
+                extracted_new = partial(stream_extract_bytes, result.read_body(), extract_mode)
+                if diff_snapshot(extracted_new, snapshots[file_type], diff_dir, file_type, ctx, extract_mode, pending):
+                    files_with_diffs.append(file_type)
+                if result.validator:
+                    validators[file_type] = result.validator
+
+            def save_validators():
+                # after the snapshots were replaced, so their new content is recorded
+                for file_type, validator in validators.items():
+                    stamps[f"sekai/{file_type}"] = [validator, _content_stamp(snapshots[file_type])]
+                write_json_if_changed(DIFF_STAMPS_FILE, stamps)
+            pending.append((save_validators, None))
+
+        elif mode=="local":
+            sources = {
+                jp_cards_master: ("jp_cards", "cards"),
+                en_cards_master: ("en_cards", "cards"),
+                jp_banners_master: ("jp_banners", "banner"),
+                en_banners_master: ("en_banners", "banner"),
+                jp_events_master: ("jp_events", "event"),
+                en_events_master: ("en_events", "event"),
+            }
+            # (size, mtime) of master file and snapshot after the last diff, if neither
+            # changed since, diffing them again cannot find anything
+            stamps = load_optional_json(DIFF_STAMPS_FILE, {})
+            master_stamps = {}
+            for master_path, (file_type, extract_mode) in sources.items():
+                master_stamps[file_type] = _file_stamp(master_path)
+                if stamps.get(file_type) == [master_stamps[file_type], _file_stamp(snapshots[file_type])]:
+                    print(f"{file_type}: master file and snapshot unchanged since the last diff")
+                    continue
+                extracted_new = partial(stream_extract_file, master_path, extract_mode)
+                if diff_snapshot(extracted_new, snapshots[file_type], diff_dir, file_type, ctx, extract_mode, pending):
+                    files_with_diffs.append(file_type)
+
+            def save_stamps():
+                # after the snapshots were replaced, so their new size and mtime are recorded
+                for file_type, master_stamp in master_stamps.items():
+                    stamps[file_type] = [master_stamp, _file_stamp(snapshots[file_type])]
+                write_json_if_changed(DIFF_STAMPS_FILE, stamps)
+            pending.append((save_stamps, None))
+
+        else:
+            raise ValueError(f"Unknown extract mode '{mode}'")
+    except BaseException:
+        for _, discard in pending:
+            if discard is not None:
+                discard()
+        raise
+
+    for commit, discard in pending:
+        if ctx is not None:
+            ctx.defer(commit, discard)
         else:
-            print("All files have 0 differences")
-
-
-    elif mode=="local":
-        jp_cards_extracted_master = extract_keys_by_mode(load_json(jp_cards_master), "cards")
-        en_cards_extracted_master = extract_keys_by_mode(load_json(en_cards_master),"cards")
-        jp_banners_extracted_master = extract_keys_by_mode(load_json(jp_banners_master),"banner")
-        en_banners_extracted_master = extract_keys_by_mode(load_json(en_banners_master),"banner")
-        jp_events_extracted_master = extract_keys_by_mode(load_json(jp_events_master),"event")
-        en_events_extracted_master = extract_keys_by_mode(load_json(en_events_master),"event")
-
-        jp_cards_diff = get_json_differences(load_json(jp_cards_extracted), jp_cards_extracted_master, "cards")
-        en_cards_diff = get_json_differences(load_json(en_cards_extracted),en_cards_extracted_master, "cards")
-        jp_banners_diff = get_json_differences(load_json(jp_banners_extracted),jp_banners_extracted_master)
-        en_banners_diff = get_json_differences(load_json(en_banners_extracted),en_banners_extracted_master)
-        jp_events_diff = get_json_differences(load_json(jp_events_extracted),jp_events_extracted_master)
-        en_events_diff = get_json_differences(load_json(en_events_extracted),en_events_extracted_master)
-
-        diffs = [
-            (jp_cards_diff, "jp_cards_diff.json", jp_cards_extracted_master, jp_cards_extracted, "jp_cards"),
-            (en_cards_diff, "en_cards_diff.json", en_cards_extracted_master, en_cards_extracted, "en_cards"),
-            (jp_banners_diff, "jp_banners_diff.json", jp_banners_extracted_master, jp_banners_extracted, "jp_banners"),
-            (en_banners_diff, "en_banners_diff.json", en_banners_extracted_master, en_banners_extracted, "en_banners"),
-            (jp_events_diff, "jp_events_diff.json", jp_events_extracted_master, jp_events_extracted, "jp_events"),
-            (en_events_diff, "en_events_diff.json", en_events_extracted_master, en_events_extracted, "en_events")
-        ]
-
-        os.makedirs(diff_dir, exist_ok=True)
-
-        files_with_diffs = []
-
-        for diff, filename, extracted_new, extracted_path, file_type in diffs:
-            if len(diff) > 0:
-                save_json(os.path.join(diff_dir, filename), diff)
-                save_json(extracted_path, extracted_new)
-                files_with_diffs.append(file_type)
-
-        if files_with_diffs:
-            print(f"Files with differences: {', '.join(files_with_diffs)}")
+            # the diffs are in data/diff already, nothing is lost by moving the snapshots on
+            commit()
+
+    if files_with_diffs:
+        files_with_diffs.sort(key=list(snapshots).index)
+        print(f"Files with differences: {', '.join(files_with_diffs)}")
+    else:
+        print("All files have 0 differences")
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _content_stamp(path):
+    """[size, sha1] of a snapshot, unlike its mtime this survives a fresh checkout in CI"""
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    return [len(content), hashlib.sha1(content).hexdigest()]
+
+
+def diff_snapshot(extracted_new, extracted_path, diff_dir, file_type, ctx=None, extract_mode=None, pending=None):
+    """Compare new extracted records against the stored snapshot.
+
+    extracted_new is a list of records or a callable returning a fresh iterable of them.
+    Both sides are merge-joined by id while streaming; if either is not sorted by id the
+    content hash index is used instead, which reads the new records a second time.
+    Added records go to <file_type>_diff.json and changed ones to <file_type>_modified.json.
+    The snapshot update is appended to pending as a (commit, discard) pair, or done right
+    away without pending. Returns True if either file was written.
+    """
+    open_new = extracted_new if callable(extracted_new) else lambda: extracted_new
+    try:
+        changes = merge_snapshot(open_new(), extracted_path, extract_mode, pending)
+    except UnorderedInput as error:
+        print(f"{file_type}: {error}, falling back to the hash diff")
+        metrics.count("unordered_diff_fallbacks")
+        changes = hash_diff_snapshot(open_new(), extracted_path, extract_mode, pending)
+    if changes is None:
+        print(f"No upstream data for {file_type}, keeping existing snapshot")
+        return False
+
+    added, modified, removed = changes
+    metrics.count("records_changed", len(added) + len(modified) + len(removed))
+    if not added and not modified and not removed:
+        return False
+
+    print(f"{file_type}: {len(added)} added, {len(modified)} modified, {len(removed)} removed")
+    for name, records in ((f"{file_type}_diff", added), (f"{file_type}_modified", modified)):
+        if not records:
+            continue
+        if ctx is not None:
+            ctx.diffs[name] = records
         else:
-            print("All files have 0 differences")
- 
\ No newline at end of file
+            save_json(os.path.join(diff_dir, f"{name}.json"), records)
+    return bool(added or modified)
+
+
+def _stored_records(extracted_path, extract_mode, state):
+    """Snapshot records streamed from disk, projected like newly extracted ones"""
+    if not os.path.exists(extracted_path):
+        return
+    project = projector(extract_mode) if extract_mode is not None else None
+    with open(extracted_path, "r", encoding="utf-8") as f:
+        for record in iter_array(f):
+            if project is not None:
+                projected = project(record)
+                if projected != record:
+                    # written before a projection change, rewrite it even if nothing else changed
+                    state["reshaped"] = True
+                    record = projected
+            yield record
+
+
+def _defer(pending, commit, discard=None):
+    if pending is None:
+        commit()
+    else:
+        pending.append((commit, discard))
+
+
+def merge_snapshot(new_records, extracted_path, extract_mode=None, pending=None):
+    """Merge-join the snapshot on disk with id-sorted new records, streaming the merged snapshot back.
+
+    Returns (added, modified, removed ids), or None if there were no new records.
+    Raises UnorderedInput, leaving the snapshot untouched, if either side is not sorted.
+    """
+    added, modified, removed = [], [], []
+    state = {"extracted": 0, "reshaped": False}
+
+    def merged():
+        for change, old, new in merge_diff(_stored_records(extracted_path, extract_mode, state), new_records):
+            if change == "delete":
+                removed.append(str(old["id"]))
+                continue
+            state["extracted"] += 1
+            if change == "insert":
+                added.append(new)
+            elif change == "update":
+                modified.append(new)
+            yield new
+
+    def keep():
+        return bool(state["extracted"] and (added or modified or removed or state["reshaped"]))
+
+    staged = stage_json_array(extracted_path, merged(), indent=4, keep=keep)
+    if staged is not None:
+        def commit():
+            commit_staged(staged, extracted_path)
+            # the hash index described the old snapshot, hash_diff_snapshot rebuilds it when needed
+            hashes_path = extracted_path.replace("_extracted.json", "_hashes.json")
+            if os.path.exists(hashes_path):
+                os.remove(hashes_path)
+        _defer(pending, commit, partial(discard_staged, staged))
+    if not state["extracted"]:
+        return None
+    metrics.count("records_extracted", state["extracted"])
+    return added, modified, removed
+
+
+def hash_diff_snapshot(new_records, extracted_path, extract_mode=None, pending=None):
+    """Diff against the snapshot's content hash index, for records in any order.
+
+    Returns (added, modified, removed ids), or None if there were no new records.
+    """
+    hashes_path = extracted_path.replace("_extracted.json", "_hashes.json")
+    snapshot = load_json(extracted_path)
+    old_hashes = load_optional_json(hashes_path, {})
+    reshaped = False
+    if extract_mode is not None and snapshot:
+        # snapshots written before a projection change hold fields that are no longer extracted,
+        # compare against the projected snapshot so they do not show up as modified
+        projected = extract_keys_by_mode(snapshot, extract_mode)
+        if projected != snapshot:
+            snapshot = projected
+            old_hashes = {}
+            reshaped = True
+    if not old_hashes and snapshot:
+        old_hashes = build_hash_index(snapshot)
+
+    added, modified, removed, new_hashes = diff_by_content_hash(old_hashes, new_records)
+    if not new_hashes:
+        return None
+    metrics.count("records_extracted", len(new_hashes))
+
+    if added or modified or removed:
+        _defer(pending, partial(save_json, extracted_path, apply_changes(snapshot, added, modified, removed)))
+    elif reshaped:
+        _defer(pending, partial(save_json, extracted_path, snapshot))
+    if added or modified or removed or reshaped or not os.path.exists(hashes_path):
+        _defer(pending, partial(save_json, hashes_path, new_hashes))
+    return added, modified, removed
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from . import json_codec, metrics
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+CACHE_DIR = os.path.join(parent_dir, "data", "cache", "http")
+REQUEST_TIMEOUT = 30
+POOL_SIZE = 8
+
+# url -> (validator, parsed body) for files already parsed during this run
+_parsed_bodies: Dict[str, tuple] = {}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class FetchResult(NamedTuple):
+    url: str
+    data: Any
+    status: int
+    size: int
+    elapsed: float
+    # raw response body, only kept when fetched with parse=False
+    body: Optional[bytes] = None
+    # [ETag, Last-Modified] of the body, None if upstream sent neither
+    validator: Optional[list] = None
+    # cached copy of the body, for a 304 fetched with parse=False
+    body_path: Optional[str] = None
+
+    def read_body(self) -> bytes:
+        """Raw body of a parse=False fetch, read from the cache only now for a 304"""
+        if self.body is not None:
+            return self.body
+        with open(self.body_path, "rb") as f:
+            return f.read()
+
+
+def get_session() -> requests.Session:
+    """Shared keep-alive session used for every upstream request"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _cache_paths(url: str, cache_dir: str) -> tuple:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json"), os.path.join(cache_dir, f"{key}.meta.json")
+
+
+def _load_meta(meta_path: str) -> Dict:
+    try:
+        return json_codec.load_path(meta_path)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_atomic(path: str, content: bytes):
+    # unique temp name, fetch_all workers may write the same entry at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def fetch_json_from_url(url: str, cache_dir: Optional[str] = None) -> Any:
+    """Fetch JSON data from URL, revalidating the on-disk copy with ETag/Last-Modified"""
+    return fetch_json_with_stats(url, cache_dir).data
+
+
+def fetch_json_with_stats(url: str, cache_dir: Optional[str] = None, parse: bool = True) -> FetchResult:
+    """Fetch JSON data from URL and report status, bytes received and latency.
+
+    With parse=False the body is returned undecoded, for callers that stream it; after a
+    304 it is left in the cache until read_body(), callers that only need to know it is
+    unchanged (see result.validator) never read it.
+    """
+    started = time.perf_counter()
+    cache_dir = cache_dir or CACHE_DIR
+    body_path, meta_path = _cache_paths(url, cache_dir)
+
+    meta = _load_meta(meta_path) if os.path.exists(body_path) else {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    metrics.count("http_requests")
+    metrics.count("bytes_fetched", len(response.content))
+
+    if response.status_code == 304 and meta:
+        validator = (meta.get("etag"), meta.get("last_modified"))
+        cached = _parsed_bodies.get(url)
+        metrics.count("http_not_modified")
+        if not parse:
+            return FetchResult(url, None, 304, len(response.content), time.perf_counter() - started,
+                               validator=list(validator), body_path=body_path)
+        if cached and cached[0] == validator:
+            metrics.count("parsed_body_cache_hits")
+            data = cached[1]
+        else:
+            with open(body_path, "rb") as f:
+                data = json_codec.loads(f.read())
+            _parsed_bodies[url] = (validator, data)
+        return FetchResult(url, data, 304, len(response.content), time.perf_counter() - started,
+                           validator=list(validator))
+
+    response.raise_for_status()
+    body = response.content
+    data = json_codec.loads(body) if parse else None
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(body_path, body)
+        new_meta = {"url": url, "etag": etag, "last_modified": last_modified}
+        _write_atomic(meta_path, json_codec.encode(new_meta))
+        if parse:
+            _parsed_bodies[url] = ((etag, last_modified), data)
+
+    return FetchResult(url, data, response.status_code, len(body), time.perf_counter() - started,
+                       None if parse else body, [etag, last_modified] if etag or last_modified else None)
+
+
+def fetch_all(urls: List[str], cache_dir: Optional[str] = None, parse: bool = True) -> Iterator[FetchResult]:
+    """Download several JSON files at once, yielding each one as soon as it arrives"""
+    with ThreadPoolExecutor(max_workers=min(len(urls), POOL_SIZE) or 1) as pool:
+        futures = [pool.submit(fetch_json_with_stats, url, cache_dir, parse) for url in urls]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,69 @@
+import json
+import os
+from typing import IO, Any, Iterable, Tuple, Union
+from . import json_writer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Every JSON read and write of the pipeline goes through here. Parsing uses orjson
+# when it is installed (JSON_BACKEND=json forces the stdlib), output is always
+# laid out by json_writer so files are byte-identical whichever backend runs.
+
+BACKEND = "orjson" if orjson is not None and os.getenv("JSON_BACKEND") != "json" else "json"
+
+_decoder = json.JSONDecoder()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN/Infinity, integers past 64 bits and BOMs are left to the stdlib,
+            # which raises the usual error if the document is really invalid
+            pass
+    return json.loads(data)
+
+
+def raw_decode(text: str, pos: int = 0) -> Tuple[Any, int]:
+    """One value starting at pos and the offset after it, always the stdlib: orjson
+    has no incremental decoding. Raises json.JSONDecodeError (a ValueError)."""
+    return _decoder.raw_decode(text, pos)
+
+
+def load(f: IO) -> Any:
+    """Parse an open file, text or binary"""
+    return loads(f.read())
+
+
+def load_path(path: str) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dumps(data: Any, indent: int = 2) -> str:
+    return json_writer.dumps(data, indent)
+
+
+def encode(data: Any, indent: int = 2) -> bytes:
+    return json_writer.dumps(data, indent).encode("utf-8")
+
+
+def dump(data: Any, f: IO[str], indent: int = 2):
+    json_writer.dump(data, f, indent)
+
+
+def dump_array(records: Iterable[Any], f: IO[str], indent: int = 2):
+    json_writer.dump_array(records, f, indent)
+
+
+def canonical(data: Any) -> str:
+    """Compact form with sorted keys, the input of content hashes.
+
+    Always the stdlib encoder: orjson formats some floats differently, which
+    would change every stored hash.
+    """
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
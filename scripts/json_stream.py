@@ -0,0 +1,143 @@
+import io
+import json
+import os
+from typing import IO, Any, Callable, Dict, Iterable, Iterator
+from . import json_codec
+
+# Streaming extraction of the upstream master files, each one large JSON array.
+# Records are decoded one at a time and cut down to the fields the pipeline keeps
+# before the next one is read, so the full upstream schema is never in memory at once.
+
+CHUNK_SIZE = 1 << 16
+
+MODE_KEYS = {
+    "cards": ("id", "characterId", "attr", "cardRarityType", "cardSupplyId", "prefix", "releaseAt"),
+    "banner": ("id", "name", "endAt", "startAt", "gachaPickups", "gachaDetails"),
+    "event": ("id", "unit", "eventType", "name", "startAt", "aggregateAt", "closedAt"),
+}
+
+# list fields whose rows are cut down as well, only the card ids of gacha rows are used
+NESTED_KEYS = {
+    "banner": {"gachaPickups": ("cardId",), "gachaDetails": ("cardId",)},
+}
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class _Buffer:
+    """Text read from a file so far, refilled whenever a value runs past its end"""
+
+    def __init__(self, f: IO[str], chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+
+    def read_more(self) -> bool:
+        # read at least as much as is still pending, so a record spanning many
+        # chunks is re-decoded a logarithmic number of times
+        chunk = self.f.read(max(self.chunk_size, len(self.text) - self.pos))
+        if not chunk:
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, "" at the end of the file"""
+        while True:
+            text, pos = self.text, self.pos
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self.read_more():
+                return ""
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = json_codec.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.read_more():
+                    continue
+                raise
+            # a value is only complete once something follows that cannot continue it:
+            # cut at the end of the buffer, "0.1" decodes as 0 and "1e5" as 1
+            if self._runs_to_end(end) and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+    def _runs_to_end(self, pos: int) -> bool:
+        """Whether only number characters follow pos up to the end of the buffer"""
+        text = self.text
+        while pos < len(text) and text[pos] in _NUMBER_CHARS:
+            pos += 1
+        return pos == len(text)
+
+
+def iter_array(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Decode the items of a top-level JSON array one at a time"""
+    buffer = _Buffer(f, chunk_size)
+    if buffer.peek() != "[":
+        raise ValueError("Expected a JSON array")
+    buffer.pos += 1
+    if buffer.peek() == "]":
+        return
+    while True:
+        yield buffer.decode()
+        char = buffer.peek()
+        buffer.pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+
+
+def projector(mode: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Function keeping only the mode's fields of a record"""
+    keys = MODE_KEYS.get(mode)
+    if not keys:
+        raise ValueError(f"No keys defined for mode '{mode}'")
+    nested = NESTED_KEYS.get(mode, {})
+
+    def project(record: Dict[str, Any]) -> Dict[str, Any]:
+        projected = {}
+        for key in keys:
+            if key not in record:
+                continue
+            value = record[key]
+            row_keys = nested.get(key)
+            if row_keys is not None and isinstance(value, list):
+                value = [{k: row[k] for k in row_keys if k in row} for row in value]
+            projected[key] = value
+        return projected
+
+    return project
+
+
+def project_records(records: Iterable[Dict[str, Any]], mode: str) -> Iterator[Dict[str, Any]]:
+    """Keep only the mode's fields of each record, lazily"""
+    return map(projector(mode), records)
+
+
+def stream_extract(f: IO[str], mode: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    return project_records(iter_array(f, chunk_size), mode)
+
+
+def stream_extract_file(path: str, mode: str) -> Iterator[Dict[str, Any]]:
+    """Projected records of a master file on disk, nothing if the file is missing"""
+    if not os.path.exists(path):
+        print(f"File not found: {path}, returning fallback value")
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from stream_extract(f, mode)
+
+
+def stream_extract_bytes(body: bytes, mode: str) -> Iterator[Dict[str, Any]]:
+    """Projected records of a downloaded response body"""
+    return stream_extract(io.TextIOWrapper(io.BytesIO(body), encoding="utf-8-sig"), mode)
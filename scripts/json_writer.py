@@ -0,0 +1,129 @@
+from json.encoder import encode_basestring
+from typing import Any, Iterable, Iterator, List
+
+# Output layout shared by every file the pipeline writes: objects and lists of
+# objects are indented, lists of scalars stay on one line, e.g.
+#
+# [
+#   {
+#     "id": 1,
+#     "cards": [88, 92, 96, 4]
+#   }
+# ]
+#
+# The encoder is a single pass over the data, so it costs the same as json.dumps
+# regardless of how many list keys the records carry.
+
+_INFINITY = float("inf")
+
+
+def _encode_float(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == _INFINITY:
+        return "Infinity"
+    if value == -_INFINITY:
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _encode_scalar(value: Any) -> str:
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _encode_float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_key(key: Any) -> str:
+    if isinstance(key, str):
+        return encode_basestring(key)
+    # same coercion as json.dumps for non-string keys
+    return encode_basestring(_encode_scalar(key))
+
+
+def _is_scalar_list(value: list) -> bool:
+    for item in value:
+        if isinstance(item, (dict, list, tuple)):
+            return False
+    return True
+
+
+def _encode(value: Any, out: List[str], indent: str, level: int):
+    if isinstance(value, dict):
+        if not value:
+            out.append("{}")
+            return
+        separator = "\n" + indent * (level + 1)
+        out.append("{")
+        first = True
+        for key, item in value.items():
+            out.append(separator if first else "," + separator)
+            first = False
+            out.append(_encode_key(key))
+            out.append(": ")
+            _encode(item, out, indent, level + 1)
+        out.append("\n" + indent * level + "}")
+    elif isinstance(value, (list, tuple)):
+        if _is_scalar_list(value):
+            out.append("[" + ", ".join(map(_encode_scalar, value)) + "]")
+            return
+        separator = "\n" + indent * (level + 1)
+        out.append("[")
+        first = True
+        for item in value:
+            out.append(separator if first else "," + separator)
+            first = False
+            _encode(item, out, indent, level + 1)
+        out.append("\n" + indent * level + "]")
+    else:
+        out.append(_encode_scalar(value))
+
+
+def iter_encode_array(records: Iterable[Any], indent: int = 2) -> Iterator[str]:
+    """Encode a stream of records as a JSON array without collecting it first.
+
+    Same layout as iter_encode for lists of objects, which is the shape of every output file.
+    """
+    pad = " " * indent
+    first = True
+    for record in records:
+        out = ["[\n" if first else ",\n", pad]
+        first = False
+        _encode(record, out, pad, 1)
+        yield "".join(out)
+    yield "[]\n" if first else "\n]\n"
+
+
+def iter_encode(data: Any, indent: int = 2) -> Iterator[str]:
+    """Encode data chunk by chunk, one chunk per top-level record"""
+    if isinstance(data, (list, tuple)) and not _is_scalar_list(data):
+        yield from iter_encode_array(data, indent)
+        return
+
+    out = []
+    _encode(data, out, " " * indent, 0)
+    out.append("\n")
+    yield "".join(out)
+
+
+def dumps(data: Any, indent: int = 2) -> str:
+    return "".join(iter_encode(data, indent))
+
+
+def dump(data: Any, f, indent: int = 2):
+    for chunk in iter_encode(data, indent):
+        f.write(chunk)
+
+
+def dump_array(records: Iterable[Any], f, indent: int = 2):
+    for chunk in iter_encode_array(records, indent):
+        f.write(chunk)
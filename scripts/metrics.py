@@ -0,0 +1,178 @@
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from . import json_codec
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+REPORT_FILE = os.path.join(parent_dir, "data", "metrics", "run_report.json")
+
+# recorder of the running pipeline, hooks are no-ops while it is None
+_active: Optional["MetricsRecorder"] = None
+
+
+class StageMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.peak_memory_bytes: Optional[int] = None
+        self.counters: Dict[str, int] = {}
+        # function name -> [calls, wall seconds]
+        self.timers: Dict[str, List] = {}
+
+    def to_dict(self) -> Dict:
+        return {
+            "stage": self.name,
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "counters": dict(sorted(self.counters.items())),
+            "timers": {name: {"calls": calls, "wall_s": round(wall, 6)}
+                       for name, (calls, wall) in sorted(self.timers.items())},
+        }
+
+
+class MetricsRecorder:
+    """Collects wall/CPU time, I/O counters and, with trace_memory, peak memory per pipeline stage.
+
+    Memory tracing goes through tracemalloc, which slows the run down several times,
+    so it is off unless asked for.
+
+    Counters reported from worker threads count towards the running stage, those
+    reported while no stage runs are grouped under "other".
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: List[StageMetrics] = []
+        self.current: Optional[StageMetrics] = None
+        self.started_at = time.time()
+        self._outside = StageMetrics("other")
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "MetricsRecorder":
+        global _active
+        _active = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str):
+        stage = StageMetrics(name)
+        self.stages.append(stage)
+        self.current = stage
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall_s = time.perf_counter() - wall_started
+            stage.cpu_s = time.process_time() - cpu_started
+            if self.trace_memory and tracemalloc.is_tracing():
+                stage.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            self.current = None
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            stage = self.current or self._outside
+            stage.counters[name] = stage.counters.get(name, 0) + value
+
+    def add_time(self, name: str, elapsed: float):
+        with self._lock:
+            stage = self.current or self._outside
+            timer = stage.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += elapsed
+
+    def totals(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for stage in self.stages + [self._outside]:
+            for name, value in stage.counters.items():
+                totals[name] = totals.get(name, 0) + value
+        return dict(sorted(totals.items()))
+
+    def report(self) -> Dict:
+        stages = self.stages + ([self._outside] if self._outside.counters or self._outside.timers else [])
+        return {
+            "started_at": int(self.started_at),
+            "wall_s": round(sum(stage.wall_s for stage in self.stages), 6),
+            "cpu_s": round(sum(stage.cpu_s for stage in self.stages), 6),
+            "peak_memory_bytes": (max((stage.peak_memory_bytes or 0 for stage in self.stages), default=0)
+                                  if self.trace_memory else None),
+            "totals": self.totals(),
+            "stages": [stage.to_dict() for stage in stages],
+        }
+
+    def write_report(self, path: str = REPORT_FILE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json_codec.dump(self.report(), f)
+        print(f"Run report written to {path}")
+
+    def write_openmetrics(self, path: str):
+        lines = []
+
+        def family(name: str, kind: str, help_text: str, samples: List[tuple]):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        family("pipeline_stage_wall_seconds", "gauge", "Wall time of the stage.",
+               [({"stage": stage.name}, stage.wall_s) for stage in self.stages])
+        family("pipeline_stage_cpu_seconds", "gauge", "CPU time of the stage.",
+               [({"stage": stage.name}, stage.cpu_s) for stage in self.stages])
+        family("pipeline_stage_peak_memory_bytes", "gauge", "Peak traced memory during the stage.",
+               [({"stage": stage.name}, stage.peak_memory_bytes) for stage in self.stages
+                if stage.peak_memory_bytes is not None])
+        counter_names = sorted({name for stage in self.stages + [self._outside] for name in stage.counters})
+        for counter in counter_names:
+            family(f"pipeline_{counter}", "gauge", f"{counter.replace('_', ' ').capitalize()} during the stage.",
+                   [({"stage": stage.name}, stage.counters[counter])
+                    for stage in self.stages + [self._outside] if counter in stage.counters])
+        lines.append("# EOF")
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"OpenMetrics written to {path}")
+
+
+def count(name: str, value: int = 1):
+    """Add to a counter of the running stage, if metrics are being recorded"""
+    if _active is not None:
+        _active.count(name, value)
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator recording calls and wall time of a hot function in the running stage"""
+    def decorator(func: Callable) -> Callable:
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _active.add_time(label, time.perf_counter() - started)
+        return wrapper
+    return decorator
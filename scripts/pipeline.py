@@ -0,0 +1,169 @@
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+from .transformers.card_store import CardStore
+from .transformers.banner_pools import compact_banners, expand_banners
+from .common_update import load_json, write_outputs
+from .append_store import append_records, fingerprint, has_writer_layout, recover_append, remember_layout
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+OUTPUT_FILES = {
+    "cards": "cards.json",
+    "jp_banners": "jp_banners.json",
+    "en_banners": "en_banners.json",
+    "jp_events": "jp_events.json",
+    "en_events": "en_events.json",
+}
+
+# outputs that mostly grow at the tail, appended to in place when no existing record changed
+APPEND_FILES = ("cards", "jp_banners", "jp_events")
+
+# optional gachaDetails-pooled copies of the banner files, see banner_pools
+COMPACT_FILES = {
+    "jp_banners": "jp_banners.compact.json",
+    "en_banners": "en_banners.compact.json",
+}
+
+
+class PipelineContext:
+    """State shared by the stages of one pipeline run.
+
+    Output files are parsed on first use, diffs are passed between stages in
+    memory, and flush() writes each changed output exactly once.
+    """
+
+    def __init__(self, root_dir: str = parent_dir, compact: bool = False):
+        self.root_dir = root_dir
+        self.compact = compact
+        self.diff_dir = os.path.join(root_dir, "data", "diff")
+        # keyed like the diff files: "jp_cards_diff", "en_events_modified", ...
+        self.diffs: Dict[str, List[Dict]] = {}
+        self._data: Dict[str, List[Dict]] = {}
+        self._dirty = set()
+        self._card_store: Optional[CardStore] = None
+        # name -> (record count, fingerprint) of APPEND_FILES as loaded
+        self._loaded: Dict[str, tuple] = {}
+        # (commit, discard) pairs of state that may only change once the outputs are written,
+        # e.g. the extracted snapshots: committed early, a failed run would lose its diffs
+        self._pending: List[Tuple[Callable[[], None], Optional[Callable[[], None]]]] = []
+
+    @classmethod
+    def from_diff_dir(cls, root_dir: str = parent_dir) -> "PipelineContext":
+        """Context for running a single stage on the diff files left by extract_and_diff"""
+        ctx = cls(root_dir)
+        if os.path.exists(ctx.diff_dir):
+            for filename in sorted(os.listdir(ctx.diff_dir)):
+                if filename.endswith(".json"):
+                    ctx.diffs[filename[:-len(".json")]] = load_json(os.path.join(ctx.diff_dir, filename))
+        return ctx
+
+    def output_path(self, name: str) -> str:
+        return os.path.join(self.root_dir, OUTPUT_FILES[name])
+
+    def has_diff(self, *names: str) -> bool:
+        return any(name in self.diffs for name in names)
+
+    def diff(self, name: str) -> List[Dict]:
+        return self.diffs.get(name, [])
+
+    def get(self, name: str) -> List[Dict]:
+        if name == "cards" and self._card_store is not None:
+            return self._card_store.cards
+        if name not in self._data:
+            if name in APPEND_FILES:
+                recover_append(self.output_path(name))
+            # banner files may hold the compact format, stages always see plain lists
+            self._data[name] = expand_banners(load_json(self.output_path(name)))
+            if name in APPEND_FILES:
+                self._loaded[name] = (len(self._data[name]), fingerprint(self._data[name]))
+        return self._data[name]
+
+    def set(self, name: str, data: List[Dict]):
+        if name == "cards":
+            self._card_store = None
+        self._data[name] = data
+        self._dirty.add(name)
+
+    def mark_dirty(self, name: str):
+        self._dirty.add(name)
+
+    @property
+    def card_store(self) -> CardStore:
+        if self._card_store is None:
+            self._card_store = CardStore(self.get("cards"))
+            self._data["cards"] = self._card_store.cards
+        return self._card_store
+
+    def defer(self, commit: Callable[[], None], discard: Optional[Callable[[], None]] = None):
+        """Run commit at the end of flush(), or discard if the run fails before that"""
+        self._pending.append((commit, discard))
+
+    def discard_pending(self):
+        """Drop the deferred work of a failed run, so the next run diffs the same changes again"""
+        pending, self._pending = self._pending, []
+        for _, discard in pending:
+            if discard is not None:
+                discard()
+
+    def _append(self, name: str) -> Optional[int]:
+        """Bring an output file up to date by appending the records added since loading.
+
+        Returns the number of records appended, or None if the file needs a full rewrite.
+        """
+        if name not in self._loaded:
+            return None
+        count, loaded = self._loaded[name]
+        data = self.get(name)
+        path = self.output_path(name)
+        if loaded is None or count == 0 or len(data) < count or fingerprint(data[:count]) != loaded:
+            return None
+        if len(data) == count:
+            return 0 if has_writer_layout(path) else None
+        if not append_records(path, data[count:], data[count - 1]):
+            return None
+        self._loaded[name] = (len(data), fingerprint(data))
+        return len(data) - count
+
+    def flush(self) -> List[str]:
+        """Write every output changed during the run, returns the names actually written"""
+        names = [name for name in OUTPUT_FILES if name in self._dirty]
+        appended = {}
+        for name in names:
+            if name in APPEND_FILES:
+                added = self._append(name)
+                if added is not None:
+                    appended[name] = added
+        rewritten = [name for name in names if name not in appended]
+        outputs = {self.output_path(name): self.get(name) for name in rewritten}
+        if self.compact:
+            for name in names:
+                if name in COMPACT_FILES:
+                    outputs[os.path.join(self.root_dir, COMPACT_FILES[name])] = compact_banners(self.get(name))
+        results = write_outputs(outputs)
+
+        written = []
+        for name in names:
+            if name in appended:
+                if appended[name]:
+                    print(f"Appended {appended[name]} records to {OUTPUT_FILES[name]}. Count: {len(self.get(name))}")
+                    written.append(name)
+                else:
+                    print(f"{OUTPUT_FILES[name]} unchanged, not rewritten")
+                continue
+            if name in APPEND_FILES:
+                # the file now holds exactly json_writer's output, later runs may append to it
+                remember_layout(self.output_path(name))
+                self._loaded[name] = (len(self.get(name)), fingerprint(self.get(name)))
+            if results[self.output_path(name)]:
+                print(f"Saved {OUTPUT_FILES[name]}. Count: {len(self.get(name))}")
+                written.append(name)
+            else:
+                print(f"{OUTPUT_FILES[name]} unchanged, not rewritten")
+        self._dirty.clear()
+
+        # only now may the snapshots move on to the data the outputs were built from
+        pending, self._pending = self._pending, []
+        for commit, _ in pending:
+            commit()
+        return written
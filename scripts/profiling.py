@@ -0,0 +1,96 @@
+import cProfile
+import io
+import os
+import pstats
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+PROFILE_DIR = os.path.join(parent_dir, "data", "profile")
+# recursion guard for the collapsed-stack walk
+MAX_STACK_DEPTH = 128
+
+
+def _frame_name(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        # built-ins, e.g. "<method 'append' of 'list' objects>"
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapse_stats(stats: pstats.Stats, root: str) -> Dict[str, int]:
+    """Collapsed stacks ("a;b;c" -> microseconds of self time) rebuilt from the pstats call graph.
+
+    cProfile only keeps caller -> callee edges, so the time of a function reached along
+    several paths is split between them in proportion to each edge's cumulative time.
+    """
+    entries = stats.stats
+    callees: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, edge_cumulative))
+
+    stacks: Dict[str, int] = {}
+
+    def walk(func, path: List[str], on_path: set, cumulative: float):
+        _, _, own_time, total_cumulative, _ = entries[func]
+        scale = cumulative / total_cumulative if total_cumulative else 0.0
+        micros = int(own_time * scale * 1_000_000)
+        if micros:
+            key = ";".join(path)
+            stacks[key] = stacks.get(key, 0) + micros
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for child, edge_cumulative in callees.get(func, ()):
+            if child in on_path or child not in entries:
+                continue
+            on_path.add(child)
+            walk(child, path + [_frame_name(child)], on_path, edge_cumulative * scale)
+            on_path.discard(child)
+
+    for func, (_, _, _, cumulative, callers) in entries.items():
+        if not callers:
+            walk(func, [root, _frame_name(func)], {func}, cumulative)
+    return stacks
+
+
+class StageProfiler:
+    """Runs each pipeline stage under cProfile, see app.py --profile"""
+
+    def __init__(self, out_dir: str = PROFILE_DIR):
+        self.out_dir = out_dir
+        self.stats: Dict[str, pstats.Stats] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            os.makedirs(self.out_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(self.out_dir, f"{name}.pstats"))
+            self.stats[name] = pstats.Stats(profile)
+
+    def write_collapsed(self, filename: str = "stacks.collapsed") -> str:
+        """One "stage;frame;...;frame microseconds" line per stack, as read by flamegraph.pl and speedscope"""
+        path = os.path.join(self.out_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            for name, stats in self.stats.items():
+                for stack, micros in sorted(collapse_stats(stats, name).items()):
+                    f.write(f"{stack} {micros}\n")
+        print(f"Profiles written to {self.out_dir}")
+        return path
+
+    def print_top(self, limit: int):
+        """Hottest functions over all stages by own time"""
+        if not self.stats:
+            return
+        output = io.StringIO()
+        paths = [os.path.join(self.out_dir, f"{name}.pstats") for name in self.stats]
+        pstats.Stats(*paths, stream=output).sort_stats(pstats.SortKey.TIME).print_stats(limit)
+        print(output.getvalue())
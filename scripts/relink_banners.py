@@ -0,0 +1,21 @@
+from .transformers.banner_transformer import relink_banner_history
+from .common_update import load_json, write_json_if_changed
+
+
+def relink_banners():
+    """Relink every JP banner to its EN banner, e.g. after the rerun rules changed"""
+    jp_banners = load_json("jp_banners.json")
+    en_banners = load_json("en_banners.json")
+
+    relinked = relink_banner_history(jp_banners, en_banners)
+
+    if relinked == jp_banners:
+        print("JP banner links unchanged")
+        return
+
+    write_json_if_changed("jp_banners.json", relinked)
+    print(f"JP banners relinked successfully. Count: {len(relinked)}")
+
+
+if __name__ == "__main__":
+    relink_banners()
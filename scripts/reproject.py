@@ -0,0 +1,180 @@
+import argparse
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from .pipeline import PipelineContext
+from .common_update import load_optional_json
+from . import metrics
+from .estimates import ESTIMATED_FIELDS, estimated_values, load_estimates, matches_estimate, save_estimates
+from .transformers.projection import project_normal, project_rerun
+
+# Recomputes EN estimates from their JP counterparts, e.g. after the projection
+# rules changed. Only entries in the estimates ledger are considered, and only
+# while they still hold the recorded values and lie in the future, so EN times
+# from the EN master data and hand-set values are never overwritten.
+
+# output file -> field whose EN time decides whether an estimate still lies in the future
+TIME_FIELDS = {"cards": "en_released", "en_events": "start", "en_banners": "start"}
+
+# output file -> (EN snapshot in data/extracted, output field holding the EN master id)
+EN_SOURCES = {
+    "cards": ("en_cards", "id"),
+    "en_events": ("en_events", "id"),
+    "en_banners": ("en_banners", "sekai_id"),
+}
+
+
+def _pending(name: str, records: List[Dict], entries: Dict[str, Dict], now_ms: int) -> List[Dict]:
+    """Records whose estimate can be recomputed; ledger entries that no longer apply are dropped"""
+    key, _ = ESTIMATED_FIELDS[name]
+    time_field = TIME_FIELDS[name]
+    by_key = {str(record.get(key)): record for record in records}
+    pending = []
+    for entry_key, recorded in list(entries.items()):
+        record = by_key.get(entry_key)
+        if record is None or not matches_estimate(name, record, recorded) or (record.get(time_field) or 0) <= now_ms:
+            del entries[entry_key]
+            continue
+        pending.append(record)
+    return pending
+
+
+def project_cards(cards: List[Dict], entries: Dict[str, Dict], now_ms: int) -> List[Tuple[Dict, Dict]]:
+    pending = [card for card in _pending("cards", cards, entries, now_ms) if card.get("jp_released")]
+    projected = project_normal(card["jp_released"] for card in pending)
+    return [(card, {"en_released": en_released}) for card, en_released in zip(pending, projected)]
+
+
+def project_events(en_events: List[Dict], jp_events: List[Dict], entries: Dict[str, Dict],
+                   now_ms: int) -> List[Tuple[Dict, Dict]]:
+    jp_by_id = {event.get("id"): event for event in jp_events}
+    fields = ("start", "end", "close")
+    pending = [(event, jp_by_id[event.get("id")]) for event in _pending("en_events", en_events, entries, now_ms)
+               if event.get("id") in jp_by_id]
+    projected = iter(project_normal(jp_event.get(field) or 0 for _, jp_event in pending for field in fields))
+    return [(event, {field: next(projected) for field in fields}) for event, _ in pending]
+
+
+def project_banners(en_banners: List[Dict], jp_banners: List[Dict], entries: Dict[str, Dict],
+                    now_ms: int) -> List[Tuple[Dict, Dict]]:
+    jp_by_sekai_id = {banner.get("sekai_id"): banner for banner in jp_banners}
+    normal, reruns = [], []
+    for banner in _pending("en_banners", en_banners, entries, now_ms):
+        jp_banner = jp_by_sekai_id.get(banner.get("sekai_id"))
+        if jp_banner is None:
+            continue
+        if banner.get("type") == "rerun_estimation":
+            reruns.append((banner, jp_banner))
+        else:
+            normal.append((banner, jp_banner))
+
+    projected = iter(project_normal(jp_banner.get(field) or 0 for _, jp_banner in normal for field in ("start", "end")))
+    updates = [(banner, {"start": next(projected), "end": next(projected)}) for banner, _ in normal]
+    projected_reruns = project_rerun((jp_banner.get("start", 0), jp_banner.get("end", 0)) for _, jp_banner in reruns)
+    for (banner, _), (start, end, rerun_start, rerun_end) in zip(reruns, projected_reruns):
+        updates.append((banner, {"start": start, "end": end, "rerun": [rerun_start, rerun_end]}))
+    return updates
+
+
+def _changed_fields(record: Dict, values: Dict) -> Dict[str, Tuple]:
+    return {field: (record.get(field), value) for field, value in values.items() if record.get(field) != value}
+
+
+def reproject(ctx: Optional[PipelineContext] = None, now_ms: Optional[int] = None,
+              dry_run: bool = False) -> Dict[str, int]:
+    """Recompute the pipeline's own EN estimates that are still in the future.
+
+    With dry_run, only reports what would change; neither outputs nor the ledger are touched.
+    """
+    standalone = ctx is None
+    if standalone:
+        ctx = PipelineContext()
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+
+    started = time.perf_counter()
+    estimates = load_estimates()
+    updates = {
+        "cards": project_cards(ctx.get("cards"), estimates.setdefault("cards", {}), now_ms),
+        "en_banners": project_banners(ctx.get("en_banners"), ctx.get("jp_banners"),
+                                      estimates.setdefault("en_banners", {}), now_ms),
+        "en_events": project_events(ctx.get("en_events"), ctx.get("jp_events"),
+                                    estimates.setdefault("en_events", {}), now_ms),
+    }
+
+    changes = {}
+    for name, name_updates in updates.items():
+        key, _ = ESTIMATED_FIELDS[name]
+        changes[name] = 0
+        for record, values in name_updates:
+            changed = _changed_fields(record, values)
+            if not changed:
+                continue
+            changes[name] += 1
+            if dry_run:
+                print(f"Would re-project {name} {key} {record.get(key)}: "
+                      + ", ".join(f"{field} {old} -> {new}" for field, (old, new) in changed.items()))
+                continue
+            record.update(values)
+            estimates[name][str(record.get(key))] = values
+        if changes[name] and not dry_run:
+            ctx.mark_dirty(name)
+
+    if dry_run:
+        print(f"Dry run, EN estimates that would be re-projected: {changes}")
+        return changes
+
+    save_estimates(estimates)
+    metrics.count("records_reprojected", sum(changes.values()))
+    print(f"Re-projected EN estimates in {time.perf_counter() - started:.3f}s, changed: {changes}")
+
+    if standalone:
+        ctx.flush()
+    return changes
+
+
+def seed_estimates(ctx: Optional[PipelineContext] = None, now_ms: Optional[int] = None) -> Dict[str, int]:
+    """Record the future EN times already in the outputs that the EN master data does not hold yet.
+
+    For outputs written before the ledger existed, so their estimates can be re-projected too.
+    Entries already in the ledger are kept, and outputs without an EN snapshot are skipped.
+    Hand-set future times of such records are recorded as well, so seed once, before changing any.
+    """
+    if ctx is None:
+        ctx = PipelineContext()
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+
+    estimates = load_estimates()
+    seeded = {}
+    for name, (source, source_key) in EN_SOURCES.items():
+        seeded[name] = 0
+        snapshot = load_optional_json(os.path.join(ctx.root_dir, "data", "extracted", f"{source}_extracted.json"), None)
+        if snapshot is None:
+            print(f"No {source} snapshot, not seeding {name} estimates")
+            continue
+        en_ids = {record.get("id") for record in snapshot}
+        key, _ = ESTIMATED_FIELDS[name]
+        entries = estimates.setdefault(name, {})
+        for record in ctx.get(name):
+            if record.get(source_key) in en_ids or (record.get(TIME_FIELDS[name]) or 0) <= now_ms:
+                continue
+            if str(record.get(key)) not in entries:
+                entries[str(record.get(key))] = estimated_values(name, record)
+                seeded[name] += 1
+
+    save_estimates(estimates)
+    print(f"Seeded EN estimates from the outputs: {seeded}")
+    return seeded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the pipeline's future EN estimates from JP data")
+    parser.add_argument("--dry-run", action="store_true", help="only report the estimates that would change")
+    parser.add_argument("--seed", action="store_true",
+                        help="only record the future EN estimates already in the outputs in the ledger (once, for older outputs)")
+    args = parser.parse_args()
+    if args.seed:
+        seed_estimates()
+    else:
+        reproject(dry_run=args.dry_run)
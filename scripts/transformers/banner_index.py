@@ -0,0 +1,32 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+
+class BannerCardIndex:
+    """Inverted index from card id to the positions of the banners featuring it.
+
+    Positions refer to the banner list the index was built from, so rebuild it
+    after banners are inserted or removed.
+    """
+
+    def __init__(self, banners: List[Dict]):
+        self.banners = banners
+        self.postings: Dict[int, List[int]] = {}
+        for position, banner in enumerate(banners):
+            for card_id in set(banner.get("cards", [])):
+                self.postings.setdefault(card_id, []).append(position)
+
+    def positions_sharing(self, card_ids: Iterable[int], min_common: int = 3) -> List[int]:
+        """Positions of banners sharing at least min_common distinct cards with card_ids"""
+        counts = Counter()
+        for card_id in set(card_ids):
+            counts.update(self.postings.get(card_id, ()))
+        return sorted(position for position, common in counts.items() if common >= min_common)
+
+    def first_with_card(self, card_id: int, banner_type: Optional[str] = None) -> Optional[Dict]:
+        """First banner (in list order) featuring card_id, optionally of a given banner_type"""
+        for position in self.postings.get(card_id, ()):
+            banner = self.banners[position]
+            if banner_type is None or banner.get("banner_type") == banner_type:
+                return banner
+        return None
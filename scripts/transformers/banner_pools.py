@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+COMPACT_FORMAT = "compact-banners/1"
+# start a new pool once a banner differs from every existing one by more than this many ids
+MAX_DELTA = 16
+
+
+def _delta(pool: List[int], pool_set: set, details: List[int]) -> Optional[Tuple[List[int], List[int]]]:
+    """(added, removed) turning pool into details, or None if the order cannot be reproduced"""
+    details_set = set(details)
+    removed = [card_id for card_id in pool if card_id not in details_set]
+    added = [card_id for card_id in details if card_id not in pool_set]
+    if len(details_set) != len(details) or len(set(pool)) != len(pool):
+        return None
+    if _apply_delta(pool, added, removed) != details:
+        return None
+    return added, removed
+
+
+def _apply_delta(pool: List[int], added: List[int], removed: List[int]) -> List[int]:
+    if removed:
+        removed_set = set(removed)
+        details = [card_id for card_id in pool if card_id not in removed_set]
+    else:
+        details = list(pool)
+    details.extend(added)
+    return details
+
+
+def _reference(name: str, added: List[int], removed: List[int]) -> Dict:
+    reference = {"pool": name}
+    if added:
+        reference["added"] = added
+    if removed:
+        reference["removed"] = removed
+    return reference
+
+
+def _closest_pool(pools: Dict[str, List[int]], pool_sets: Dict[str, set], details: List[int]):
+    """(delta size, pool name, (added, removed)) for the pool closest to details, or None"""
+    best = None
+    for name, pool in pools.items():
+        delta = _delta(pool, pool_sets[name], details)
+        if delta is None:
+            continue
+        size = len(delta[0]) + len(delta[1])
+        if best is None or size < best[0]:
+            best = (size, name, delta)
+    return best
+
+
+def is_compact(data: Any) -> bool:
+    return isinstance(data, dict) and data.get("format") == COMPACT_FORMAT
+
+
+def compact_banners(banners: List[Dict], max_delta: int = MAX_DELTA) -> Dict:
+    """Store gachaDetails as references to shared pools plus per-banner added/removed ids.
+
+    Lossless: banners whose list cannot be rebuilt from a pool keep their full list.
+    """
+    pools: Dict[str, List[int]] = {}
+    pool_sets: Dict[str, set] = {}
+    # pools are themselves stored as a delta from an earlier pool when that is shorter
+    stored_pools: Dict[str, Any] = {}
+    compacted = []
+
+    for banner in banners:
+        details = banner.get("gachaDetails")
+        if not isinstance(details, list) or not details:
+            compacted.append(banner)
+            continue
+
+        best = _closest_pool(pools, pool_sets, details)
+        if best is None or best[0] > max_delta:
+            if _delta(details, set(details), details) is None:
+                # duplicated ids, keep the list as is
+                compacted.append(banner)
+                continue
+            name = f"p{len(pools)}"
+            if best is not None and best[0] < len(details):
+                stored_pools[name] = _reference(best[1], *best[2])
+            else:
+                stored_pools[name] = list(details)
+            pools[name] = list(details)
+            pool_sets[name] = set(details)
+            best = (0, name, ([], []))
+
+        _, name, (added, removed) = best
+        compacted.append({**banner, "gachaDetails": _reference(name, added, removed)})
+
+    return {"format": COMPACT_FORMAT, "pools": stored_pools, "banners": compacted}
+
+
+def expand_gacha_details(reference: Any, pools: Dict[str, List[int]]) -> Any:
+    if not isinstance(reference, dict):
+        return reference
+    return _apply_delta(pools[reference["pool"]], reference.get("added", []), reference.get("removed", []))
+
+
+def expand_pools(stored_pools: Dict[str, Any]) -> Dict[str, List[int]]:
+    # a pool only ever refers to pools defined before it
+    pools = {}
+    for name, pool in stored_pools.items():
+        pools[name] = expand_gacha_details(pool, pools)
+    return pools
+
+
+def expand_banners(data: Any) -> List[Dict]:
+    """Rebuild the plain banner list from compact data; plain lists are returned unchanged"""
+    if not is_compact(data):
+        return data
+    pools = expand_pools(data["pools"])
+    banners = []
+    for banner in data["banners"]:
+        if isinstance(banner.get("gachaDetails"), dict):
+            banner = {**banner, "gachaDetails": expand_gacha_details(banner["gachaDetails"], pools)}
+        banners.append(banner)
+    return banners
@@ -1,89 +1,27 @@
 import os
-import json
 import re
+from bisect import bisect_left, bisect_right
 from typing import Dict, List, Optional
 from .mappings import CHARACTERS, UNIT_PREMIUM, JP_NAME_MAPPINGS
-import pytz
-from datetime import datetime, timedelta
-from .common_transform import get_pst_pdt_status
+from .projection import project_normal, project_rerun
+from .card_store import CardStore, as_card_store
+from .. import json_codec
+from ..metrics import timed
+from .banner_index import BannerCardIndex
 
 
 # HANDLE en_banners.json
 
 def convert_jp_time_to_en_rerun(jp_start_time: int, jp_end_time: int) -> tuple:
     """Convert JP time to EN rerun time"""
-    if jp_start_time == 0 or jp_end_time == 0:
-        return 0, 0, 0, 0
-    jp_start_dt = datetime.fromtimestamp(jp_start_time / 1000, tz=pytz.UTC)
-
-    # Add 1 year
-    en_start_dt = jp_start_dt.replace(year=jp_start_dt.year + 1)
-
-    # Get the last day of that month
-    if en_start_dt.month == 12:
-        next_month = en_start_dt.replace(
-            year=en_start_dt.year + 1, month=1, day=1)
-    else:
-        next_month = en_start_dt.replace(month=en_start_dt.month + 1, day=1)
-
-    #  12:00 PM GMT+8
-    last_day = next_month - timedelta(days=1)
-    gmt8 = pytz.timezone('Asia/Shanghai')  # GMT+8
-
-    # Create completely naive datetime (no timezone info)
-    naive_dt = datetime(
-        year=last_day.year,
-        month=last_day.month,
-        day=last_day.day,
-        hour=12,
-        minute=0,
-        second=0,
-        microsecond=0
-    )
-    en_end_dt = gmt8.localize(naive_dt)
-    # Convert to UTC
-    en_end_dt = en_end_dt.astimezone(pytz.UTC)
-    en_start_dt = en_end_dt
-    # erun array calculations
-    # add 1 year and substract 5 days for start date
-    rerun_start_dt = jp_start_dt.replace(
-        year=jp_start_dt.year + 1) - timedelta(days=5)
-    rerun_start_ms = int(rerun_start_dt.timestamp() * 1000)
-
-    # add 1 year and 5 days for end date
-    jp_end_dt = datetime.fromtimestamp(jp_end_time / 1000, tz=pytz.UTC)
-    rerun_end_dt = jp_end_dt.replace(
-        year=jp_end_dt.year + 1) + timedelta(days=5)
-    rerun_end_ms = int(rerun_end_dt.timestamp() * 1000)
-
-    # Convert back to milliseconds
-    en_start_ms = int(en_start_dt.timestamp() * 1000)
-    en_end_ms = int(en_end_dt.timestamp() * 1000)
-
-    return en_start_ms, en_end_ms, rerun_start_ms, rerun_end_ms
+    return project_rerun([(jp_start_time, jp_end_time)])[0]
 
 
 def convert_jp_time_to_en_normal(jp_start_time: int, jp_end_time: int) -> tuple:
     """Convert JP time to EN normal time (add 1 year + timezone hours)"""
     if jp_start_time == 0 or jp_end_time == 0:
         return 0, 0
-
-    # convert to datetime
-    jp_start_dt = datetime.fromtimestamp(jp_start_time / 1000, tz=pytz.UTC)
-    jp_end_dt = datetime.fromtimestamp(jp_end_time / 1000, tz=pytz.UTC)
-
-    # Add 1 year
-    en_start_dt = jp_start_dt.replace(year=jp_start_dt.year + 1)
-    en_end_dt = jp_end_dt.replace(year=jp_end_dt.year + 1)
-
-    # additional hours based on current timezone
-    timezone = get_pst_pdt_status()
-    additional_hours = 16 if timezone == "PDT" else 17
-    en_start_dt = en_start_dt + timedelta(hours=additional_hours)
-    en_end_dt = en_end_dt + timedelta(hours=additional_hours)
-    # convert back to milliseconds
-    en_start_ms = int(en_start_dt.timestamp() * 1000)
-    en_end_ms = int(en_end_dt.timestamp() * 1000)
+    en_start_ms, en_end_ms = project_normal([jp_start_time, jp_end_time])
     return en_start_ms, en_end_ms
 
 
@@ -155,22 +93,22 @@ def create_en_banner_from_jp(jp_banner: Dict, en_banners: List[Dict], jp_banners
     return en_banner
 
 
+RERUN_MIN_DAYS = 350
+RERUN_MAX_DAYS = 380
+DAY_MS = 1000 * 60 * 60 * 24
+
+
+@timed("banners.update_jp_banners_with_en_ids")
 def update_jp_banners_with_en_ids(jp_banners: List[Dict], en_banners: List[Dict]) -> List[Dict]:
     """Update JP banners with en_id from matching EN banners, handling reruns by timing"""
 
     en_banners_by_sekai_id = {}
     for en_banner in en_banners:
-        sekai_id = en_banner.get("sekai_id")
-        if sekai_id not in en_banners_by_sekai_id:
-            en_banners_by_sekai_id[sekai_id] = []
-        en_banners_by_sekai_id[sekai_id].append(en_banner)
+        en_banners_by_sekai_id.setdefault(en_banner.get("sekai_id"), []).append(en_banner)
 
     jp_banners_by_sekai_id = {}
     for jp_banner in jp_banners:
-        sekai_id = jp_banner.get("sekai_id")
-        if sekai_id not in jp_banners_by_sekai_id:
-            jp_banners_by_sekai_id[sekai_id] = []
-        jp_banners_by_sekai_id[sekai_id].append(jp_banner)
+        jp_banners_by_sekai_id.setdefault(jp_banner.get("sekai_id"), []).append(jp_banner)
 
     # Track which en_ids have been assigned to prevent duplicates
     assigned_en_ids = set()
@@ -199,77 +137,92 @@ def update_jp_banners_with_en_ids(jp_banners: List[Dict], en_banners: List[Dict]
                     updated_jp_banners.append(jp_banner_copy)
         else:
             # Multiple EN banners (reruns) - match by timing
-            # Create list of (en_banner, is_assigned) to track assignments
-            en_banner_assignments = [(en_banner, en_banner.get("id", 0) in assigned_en_ids)
-                                     for en_banner in en_banner_group]
-
-            for jp_banner in jp_banner_group:
-                jp_banner_copy = jp_banner.copy()
-                jp_start = jp_banner.get("start", 0)
-
-                best_match = None
-                best_time_diff = float('inf')
-
-                for en_banner, is_assigned in en_banner_assignments:
-                    if not is_assigned:  # Only consider unassigned EN banners
-                        en_start = en_banner.get("start", 0)
-                        if jp_start > 0 and en_start > 0:
-                            # Calculate time difference in days
-                            time_diff_ms = abs(en_start - jp_start)
-                            time_diff_days = time_diff_ms / \
-                                (1000 * 60 * 60 * 24)
-
-                            # Check if it's in the expected rerun range
-                            if 350 <= time_diff_days <= 380:
-                                if time_diff_days < best_time_diff:
-                                    best_time_diff = time_diff_days
-                                    best_match = en_banner
-
-                # Assign en_id based on best match
-                if best_match:
-                    en_id = best_match.get("id", 0)
-                    assigned_en_ids.add(en_id)
-                    # Mark this EN banner as assigned
-                    for i, (en_banner, is_assigned) in enumerate(en_banner_assignments):
-                        if en_banner == best_match:
-                            en_banner_assignments[i] = (en_banner, True)
-                            break
-                    jp_banner_copy["en_id"] = en_id
-                else:
-                    # use first unassigned EN banner, or set to 0 if all assigned
-                    en_id = 0
-                    for en_banner, is_assigned in en_banner_assignments:
-                        if not is_assigned:
-                            en_id = en_banner.get("id", 0)
-                            assigned_en_ids.add(en_id)
-                            # Mark as assigned
-                            for i, (eb, is_a) in enumerate(en_banner_assignments):
-                                if eb == en_banner:
-                                    en_banner_assignments[i] = (eb, True)
-                                    break
-                            break
-                    jp_banner_copy["en_id"] = en_id
-
-                updated_jp_banners.append(jp_banner_copy)
+            updated_jp_banners.extend(
+                match_rerun_group(jp_banner_group, en_banner_group, assigned_en_ids))
 
     return updated_jp_banners
 
 
-def find_original_limited_event_name(cards: List[int], en_banners: List[Dict], jp_banners: List[Dict]) -> str:
+def match_rerun_group(jp_banner_group: List[Dict], en_banner_group: List[Dict], assigned_en_ids: set) -> List[Dict]:
+    """Give each JP banner the closest unassigned EN banner starting 350-380 days apart.
+
+    Falls back to the first unassigned EN banner of the group, or 0 when none is left.
+    assigned_en_ids is updated in place.
+    """
+    # EN banners sorted by start; ties keep group order so the earlier banner wins
+    timeline = sorted((en_banner.get("start", 0), position, en_banner.get("id", 0))
+                      for position, en_banner in enumerate(en_banner_group))
+    starts = [start for start, _, _ in timeline]
+    group_order = [en_banner.get("id", 0) for en_banner in en_banner_group]
+    next_unassigned = 0
+
+    min_ms = RERUN_MIN_DAYS * DAY_MS
+    max_ms = RERUN_MAX_DAYS * DAY_MS
+    updated = []
+    for jp_banner in jp_banner_group:
+        jp_banner_copy = jp_banner.copy()
+        jp_start = jp_banner.get("start", 0)
+
+        best = None
+        if jp_start > 0:
+            # candidates on either side of the JP start, inside the rerun window
+            for low, high in ((jp_start + min_ms, jp_start + max_ms), (jp_start - max_ms, jp_start - min_ms)):
+                for i in range(bisect_left(starts, low), bisect_right(starts, high)):
+                    en_start, position, en_id = timeline[i]
+                    if en_start <= 0 or en_id in assigned_en_ids:
+                        continue
+                    candidate = (abs(en_start - jp_start), position, en_id)
+                    if best is None or candidate < best:
+                        best = candidate
+
+        if best:
+            en_id = best[2]
+            assigned_en_ids.add(en_id)
+        else:
+            # use first unassigned EN banner, or set to 0 if all assigned
+            while next_unassigned < len(group_order) and group_order[next_unassigned] in assigned_en_ids:
+                next_unassigned += 1
+            en_id = 0
+            if next_unassigned < len(group_order):
+                en_id = group_order[next_unassigned]
+                assigned_en_ids.add(en_id)
+        jp_banner_copy["en_id"] = en_id
+        updated.append(jp_banner_copy)
+
+    return updated
+
+
+def relink_banner_history(jp_banners: List[Dict], en_banners: List[Dict]) -> List[Dict]:
+    """Recompute en_id for the whole JP banner history in one pass, keeping the JP file order"""
+    linked = update_jp_banners_with_en_ids(jp_banners, en_banners)
+
+    # update_jp_banners_with_en_ids returns banners grouped by sekai_id, put them back in file order
+    grouped_positions = {}
+    for position, jp_banner in enumerate(jp_banners):
+        grouped_positions.setdefault(jp_banner.get("sekai_id"), []).append(position)
+    relinked = [None] * len(jp_banners)
+    for position, jp_banner in zip((p for group in grouped_positions.values() for p in group), linked):
+        relinked[position] = jp_banner
+
+    changed = sum(1 for old, new in zip(jp_banners, relinked) if old.get("en_id") != new.get("en_id"))
+    print(f"Relinked JP banners: {changed} en_id changes")
+    return relinked
+
+
+def find_original_limited_event_name(cards: List[int], en_banners: List[Dict], jp_banners: List[Dict],
+                                     en_index: Optional[BannerCardIndex] = None,
+                                     jp_index: Optional[BannerCardIndex] = None) -> str:
 
     if not cards:
         return ""
     first_card_id = cards[0]
-    for banner in en_banners:
-        if first_card_id in banner.get("cards", []):
-            if banner.get("banner_type") == "Limited Event":
-                original_name = banner.get("name", "")
-                return f"[Rerun] {original_name}"
-    for banner in jp_banners:
-        if first_card_id in banner.get("cards", []):
-            if banner.get("banner_type") == "Limited Event":
-                original_name = banner.get("name", "")
-                return f"[Rerun] {original_name}"
+    for banners, index in ((en_banners, en_index), (jp_banners, jp_index)):
+        if index is None:
+            index = BannerCardIndex(banners)
+        banner = index.first_with_card(first_card_id, "Limited Event")
+        if banner:
+            original_name = banner.get("name", "")
+            return f"[Rerun] {original_name}"
 
     return ""
 
@@ -315,11 +268,15 @@ def normalize_rerun_name(name: str) -> str:
     return name
 
 
-def update_en_banners_from_en_source(en_diff: List[Dict], en_banners: List[Dict], en_gachas_changes: List[Dict] = None) -> List[Dict]:
-    cards_data = []
-    if os.path.exists('cards.json'):
-        with open('cards.json', 'r', encoding='utf-8') as f:
-            cards_data = json.load(f)
+@timed("banners.update_en_banners_from_en_source")
+def update_en_banners_from_en_source(en_diff: List[Dict], en_banners: List[Dict], en_gachas_changes: List[Dict] = None,
+                                     card_store: Optional[CardStore] = None) -> List[Dict]:
+    if card_store is None:
+        cards_data = []
+        if os.path.exists('cards.json'):
+            cards_data = json_codec.load_path('cards.json')
+        card_store = CardStore(cards_data)
+    cards_data = card_store
     en_banner_lookup = {banner.get(
         "sekai_id"): banner for banner in en_banners}
 
@@ -418,30 +375,16 @@ def extract_rarity_4_card_ids(gacha_details: List[Dict], cards_data: List[Dict],
     # return empty array if bday
     if banner_type == "Birthday":
         return []
-    rarity_4_card_ids = []
-    card_lookup = {card.get("id"): card for card in cards_data}
-
-    # process each ganner detail
-    for detail in gacha_details:
-        card_id = detail.get("cardId")
-        if card_id:
-            # Look up the card in cards.json
-            card = card_lookup.get(card_id)
-            if card:
-
-                if card.get("rarity") == 4 or card.get("card_type") == "limited_collab":
-                    rarity_4_card_ids.append(card_id)
-
-    return rarity_4_card_ids
+    return get_gacha_details(gacha_details, cards_data)
 
 
 def get_character_ids_from_cards(card_ids: List[int], cards_data: List[Dict], characters_list: List[str]) -> List[int]:
     character_names = set()  # set to prevent duplicates
-    card_lookup = {card.get("id"): card for card in cards_data}
+    card_store = as_card_store(cards_data)
 
     # unique character names from cards
     for card_id in card_ids:
-        card = card_lookup.get(card_id)
+        card = card_store.get(card_id)
         if card:
             character_name = card.get("character")
             if character_name:
@@ -557,9 +500,9 @@ def determine_banner_type(name: str, cards: List[int], cards_data: List[Dict]) -
         first_three_cards = []
 
         # Find card data for first 3 cards
-        card_lookup = {card.get("id"): card for card in cards_data}
+        card_store = as_card_store(cards_data)
         for card_id in first_three_card_ids:
-            card_data = card_lookup.get(card_id)
+            card_data = card_store.get(card_id)
             if card_data:
                 first_three_cards.append(card_data)
         # for card in cards_data:
@@ -598,15 +541,12 @@ def determine_banner_type(name: str, cards: List[int], cards_data: List[Dict]) -
     return "Event"
 
 
-def update_en_banners(en_diff: List[Dict], en_banners: List[Dict], jp_cards: List[Dict]) -> List[Dict]:
-
-
-    lookup = {banner['id']: banner for banner in en_diff}
-    existing_sekai_ids = {item['sekai_id'] for item in en_banners}
-    highest_id = max([item.get('id', 0) for item in en_banners]) if en_banners else 0
-    next_id = highest_id + 1
-    for banner in en_banners:
-        if banner["sekai_id"] in lookup:
+def apply_banner_changes(gachas: List[Dict], banners: List[Dict], jp_cards: List[Dict]) -> List[Dict]:
+    """Copy name/start/end/gachaDetails of upstream gachas onto the banners with the same sekai_id"""
+    jp_cards = as_card_store(jp_cards)
+    lookup = {banner['id']: banner for banner in gachas}
+    for banner in banners:
+        if banner.get("sekai_id") in lookup:
             for key, value in lookup[banner["sekai_id"]].items():
                 if key == "name":
                     banner["name"] = value
@@ -615,9 +555,19 @@ def update_en_banners(en_diff: List[Dict], en_banners: List[Dict], jp_cards: Lis
                 elif key == "startAt":
                     banner["start"] = value
                 elif key == "gachaDetails":
-                    cards = get_gacha_details(
-                        value.get("gachaDetails"), jp_cards)
+                    cards = get_gacha_details(value, jp_cards)
                     banner["gachaDetails"] = cards
+    return banners
+
+
+def update_en_banners(en_diff: List[Dict], en_banners: List[Dict], jp_cards: List[Dict]) -> List[Dict]:
+
+
+    jp_cards = as_card_store(jp_cards)
+    existing_sekai_ids = {item['sekai_id'] for item in en_banners}
+    highest_id = max([item.get('id', 0) for item in en_banners]) if en_banners else 0
+    next_id = highest_id + 1
+    apply_banner_changes(en_diff, en_banners, jp_cards)
 
     # If new banner
     for banner in en_diff:
@@ -645,21 +595,21 @@ def update_en_banners(en_diff: List[Dict], en_banners: List[Dict], jp_cards: Lis
                 "gachaDetails": gachaDetails
             }
             en_banners.append(new_banner)
+            next_id += 1
             
     return en_banners
 
 
 def get_gacha_details(cards: List[Dict], jp_cards: List[Dict]) -> List[int]:
-    cd = []
-    for card in cards:
-        card_id = card.get("cardId")
-        for c in jp_cards:
-            if c.get("id") == card_id:
-                if c.get("card_type") == "limited_collab":
-                    cd.append(card_id)
-                elif c.get("rarity") == 4:
-                    cd.append(card_id)
-    return cd
+    """Ids of the 4★ and collab cards in a gacha's gachaDetails"""
+    return get_gacha_details_batch([cards], jp_cards)[0]
+
+
+def get_gacha_details_batch(details_lists: List[List[Dict]], jp_cards: List[Dict]) -> List[List[int]]:
+    """get_gacha_details for many gachas at once, using the card store's eligibility mask"""
+    card_store = as_card_store(jp_cards)
+    card_id_lists = [[card.get("cardId") for card in details or []] for details in details_lists]
+    return card_store.filter_gacha_eligible_batch(card_id_lists)
 
 
 def convert_birthday_banner_names(name: str) -> str:
@@ -686,38 +636,28 @@ def convert_birthday_banner_names(name: str) -> str:
     return f"{romaji_name} {rest.title()}".strip()
 
 
+@timed("banners.transform_diff")
 def transform_diff(banners: List[Dict], mode: str, jp_banners: List[Dict], jp_cards: List[Dict], en_banners: List[Dict]) -> List[Dict]:
     transformed_banners = []
+    jp_cards = as_card_store(jp_cards)
     index = 1
-    bday_index = 0
+    banners = [banner for banner in banners if "カラフルパスガチャ" not in banner.get("name")]
     banners_length = len(banners)
-    for banner in banners:
-        name = banner.get("name")
-        if "カラフルパスガチャ" in name:
-            continue
-        # Skip bday anniv reruns but not memories
-        # this is useless because there won't be any individual bday/anniv reruns
-        # and they're all compiled into a single memories banenr
-        # i just realized that as I was writing this
-        # oh well
-
-        # if ("HAPPY BIRTHDAY" in name or "HAPPY ANNIVERSARY" in name) and "メモリーズ" not in name:
-        #     bday_index += 1
-        # if bday_index >= 1:
-        #     for card in banner.get("gachaPickups"):
-        #         cardId = card.get("cardId")
-        #         transformed_banners[-1]["cards"].append(cardId)
-        #     continue
-
+    details_batch = get_gacha_details_batch(
+        [banner.get("gachaDetails") for banner in banners], jp_cards)
+    indexes = (BannerCardIndex(en_banners), BannerCardIndex(jp_banners))
+    for banner, gacha_details in zip(banners, details_batch):
         transformed_banner = transform_banner(
-            banner, jp_banners, index, jp_cards, en_banners, mode, banners_length)
+            banner, jp_banners, index, jp_cards, en_banners, mode, banners_length, gacha_details, indexes)
         transformed_banners.append(transformed_banner)
         index += 1
 
     return transformed_banners
 
 
-def transform_banner(banner: Dict, jp_banners: List[Dict], index: int, jp_cards: List[Dict], en_banners: List[Dict], mode: str, banners_length: int) -> Dict:
+def transform_banner(banner: Dict, jp_banners: List[Dict], index: int, jp_cards: List[Dict], en_banners: List[Dict], mode: str, banners_length: int,
+                     gacha_details: Optional[List[int]] = None,
+                     indexes: Optional[tuple] = None) -> Dict:
 
     latest_jpid = jp_banners[-1]["id"]
     latest_enid = en_banners[-1]["id"]
@@ -730,19 +670,13 @@ def transform_banner(banner: Dict, jp_banners: List[Dict], index: int, jp_cards:
     cards = []
     keywords = []
     en_id = enid
-    gachaDetails = []
     for card in banner.get("gachaPickups"):
         cardId = card.get("cardId")
         cards.append(cardId)
 
-    for card in banner.get("gachaDetails"):
-        card_id = card.get("cardId")
-        for c in jp_cards:
-            if c.get("id") == card_id:
-                if c.get("card_type") == "limited_collab":
-                    gachaDetails.append(card_id)
-                elif c.get("rarity") == 4:
-                    gachaDetails.append(card_id)
+    if gacha_details is None:
+        gacha_details = get_gacha_details(banner.get("gachaDetails"), jp_cards)
+    gachaDetails = gacha_details
 
     banner_type = determine_banner_type(name, cards, jp_cards)
 
@@ -798,8 +732,9 @@ def transform_banner(banner: Dict, jp_banners: List[Dict], index: int, jp_cards:
         en_banner["rerun"] = [rerun_start, rerun_end]
 
         # update name
+        en_index, jp_index = indexes or (None, None)
         original_name = find_original_limited_event_name(
-            cards, en_banners, jp_banners)
+            cards, en_banners, jp_banners, en_index, jp_index)
         if original_name:
             en_banner["name"] = original_name
     
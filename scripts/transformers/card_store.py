@@ -0,0 +1,93 @@
+from itertools import chain, compress
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+
+class CardStore:
+    """cards.json held in memory, indexed by id.
+
+    Cards keep their file order in `cards`. The gacha eligibility mask is rebuilt lazily after an upsert.
+    """
+
+    def __init__(self, cards: Optional[Iterable[Dict]] = None):
+        self.cards: List[Dict] = []
+        self.by_id: Dict[int, Dict] = {}
+        self._positions: Dict[int, int] = {}
+        self._mask: Optional[bytearray] = None
+        if cards:
+            self.upsert(cards)
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.cards)
+
+    def __contains__(self, card_id: int) -> bool:
+        return card_id in self.by_id
+
+    def get(self, card_id: int, default: Optional[Dict] = None) -> Optional[Dict]:
+        return self.by_id.get(card_id, default)
+
+    def upsert(self, cards: Iterable[Dict]) -> "CardStore":
+        """Replace cards whose id is already stored and append the rest"""
+        for card in cards:
+            card_id = card.get("id")
+            position = self._positions.get(card_id)
+            if position is None:
+                self._positions[card_id] = len(self.cards)
+                self.cards.append(card)
+            else:
+                self.cards[position] = card
+            self.by_id[card_id] = card
+        self._mask = None
+        return self
+
+    def to_list(self) -> List[Dict]:
+        return list(self.cards)
+
+    def gacha_eligibility_mask(self) -> bytearray:
+        """One byte per card id, set for cards listed in banner gachaDetails (4★ and collab)"""
+        if self._mask is None:
+            ids = [card_id for card_id in self.by_id if isinstance(card_id, int) and card_id >= 0]
+            mask = bytearray(max(ids, default=-1) + 1)
+            for card_id in ids:
+                card = self.by_id[card_id]
+                if card.get("rarity") == 4 or card.get("card_type") == "limited_collab":
+                    mask[card_id] = 1
+            self._mask = mask
+        return self._mask
+
+    def filter_gacha_eligible(self, card_ids: Sequence[int]) -> List[int]:
+        """Keep the eligible ids of card_ids, in order"""
+        return self.filter_gacha_eligible_batch([card_ids])[0]
+
+    def filter_gacha_eligible_batch(self, card_id_lists: Sequence[Sequence[int]]) -> List[List[int]]:
+        """Filter several id lists with a single gather over the eligibility mask"""
+        mask = self.gacha_eligibility_mask()
+        valid_lists = [[card_id for card_id in card_ids if type(card_id) is int and card_id >= 0]
+                       for card_ids in card_id_lists]
+        flat = list(chain.from_iterable(valid_lists))
+        if not flat:
+            return [[] for _ in card_id_lists]
+
+        highest = max(flat)
+        if highest >= len(mask):
+            # ids unknown to the store are never eligible
+            mask = mask + bytearray(highest + 1 - len(mask))
+        flags = itemgetter(*flat)(mask) if len(flat) > 1 else (mask[flat[0]],)
+
+        results = []
+        offset = 0
+        for card_ids in valid_lists:
+            end = offset + len(card_ids)
+            results.append(list(compress(card_ids, flags[offset:end])))
+            offset = end
+        return results
+
+
+def as_card_store(cards: Union[CardStore, Iterable[Dict], None]) -> CardStore:
+    """Accept either a CardStore or a plain list of cards"""
+    if isinstance(cards, CardStore):
+        return cards
+    return CardStore(cards)
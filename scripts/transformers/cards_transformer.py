@@ -1,10 +1,10 @@
-import pytz
-import requests
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
-import deepl
 import os
-from .common_transform import get_pst_pdt_status
+from .projection import project_normal
+from .translator import CardNameTranslator, DeepLBackend
+from ..fetch import fetch_all
+from ..metrics import timed
 from .mappings import UPCOMING_COLLAB_TAG
 
 from .mappings import (
@@ -19,39 +19,69 @@ def get_api_keys():
 
 
 import re
-from datetime import datetime, timedelta
 
 
 EVENT_CARDS_URL = "https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/eventCards.json"
 EVENT_DECK_BONUSES_URL = "https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/eventDeckBonuses.json"
+EVENTS_URL = "https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/events.json"
+CARDS_URL = "https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/cards.json"
 
-def transform_diff(card_diff: List[Dict], mode: str) -> List[Dict]:
+@timed("cards.transform_diff")
+def transform_diff(card_diff: List[Dict], mode: str, resolver: Optional["EventCardResolver"] = None,
+                   translator: Optional[CardNameTranslator] = None) -> List[Dict]:
     transformed_cards = []  
+    translations = None
+
+    # EN cards only carry id/name/en_released, so skip the JP-only enrichment
+    if mode == "jp":
+        # shared by every VS card in the diff, only downloads on first use
+        resolver = resolver or EventCardResolver()
+
+        # translate every prefix that ends up as a name in one batch
+        translator = translator or get_translator()
+        prefixes = [card.get("prefix", "") for card in card_diff if needs_translation(card)]
+        translations = translator.translate_many(prefixes)
+        translator.report()
     
     for  cards in card_diff:
-        transformed_card = transform_card(cards, mode) 
+        transformed_card = transform_card(cards, mode, resolver, translations) 
         transformed_cards.append(transformed_card)    
 
     return transformed_cards 
 
-def transform_card(card_data, mode):
+def needs_translation(card_data: Dict) -> bool:
+    """Birthday cards reuse the JP prefix and collab cards get no name"""
+    card_rarity = convert_rarity(card_data.get("cardRarityType", "rarity_1"))
+    card_type = convert_card_type(card_data.get("cardSupplyId", 1))
+    return card_rarity != 5 and card_type != "limited_collab"
+
+def transform_card(card_data, mode, resolver: Optional["EventCardResolver"] = None,
+                   translations: Optional[Dict[str, str]] = None):
+    if mode == "en":
+        return {
+            "id":card_data.get("id",0),
+            "name": card_data.get("prefix", 0),
+            "en_released": card_data.get("releaseAt",0)
+        }
+
     card_id = card_data.get('id', 0)
     character = get_character_name(card_data.get('characterId', 0))
     unit = get_unit_name(character)
-    char_id = get_character_id(character, unit, card_id)
+    char_id = get_character_id(character, unit, card_id, resolver)
     jp_prefix = card_data.get("prefix", "")
 
     card_rarity = convert_rarity(card_data.get("cardRarityType", "rarity_1"))
+    card_type = convert_card_type(card_data.get("cardSupplyId", 1))
     if card_rarity == 5:
         initial_name = get_birthday_card_name(jp_prefix)
+    elif card_type == "limited_collab":
+        initial_name = ""
     else:
-        translated_name = translate_jp_to_en(jp_prefix)
+        if translations is not None:
+            translated_name = translations.get(jp_prefix, "")
+        else:
+            translated_name = translate_jp_to_en(jp_prefix)
         initial_name = translated_name if translated_name else ""
-    
-    card_type = convert_card_type(card_data.get("cardSupplyId", 1))
-    if card_type == "limited_collab":
-        en_release_time = 0
-        initial_name = ""
 
     if mode == "jp":
         jp_release_time = card_data.get("releaseAt", 0)
@@ -72,16 +102,9 @@ def transform_card(card_data, mode):
             # sub_unit for VS
         if unit == "Virtual Singers" and card_type != "limited_collab":
             if char_id >= 27:
-                sub_unit = get_sub_unit(card_id)
+                sub_unit = get_sub_unit(card_id, resolver)
                 if sub_unit:
                     new_card["sub_unit"] = sub_unit
-
-    elif mode =="en":
-        new_card = {
-            "id":card_data.get("id",0),
-            "name": card_data.get("prefix", 0),
-            "en_released": card_data.get("releaseAt",0)
-        }
     
     return new_card
   
@@ -115,15 +138,31 @@ def update_en_cards(my_cards, en_cards_diff):
     return my_cards
 
 
+def update_jp_cards(my_cards, jp_cards_modified):
+    """Apply upstream corrections of already known JP cards"""
+    field_mappings = {"prefix": "jp_name", "releaseAt": "jp_released"}
+    modified_dict = {obj['id']: obj for obj in jp_cards_modified if 'id' in obj}
+    updated_count = 0
+
+    for card in my_cards:
+        source = modified_dict.get(card.get('id'))
+        if not source:
+            continue
+
+        changes = []
+        for source_key, key in field_mappings.items():
+            if source_key in source and card.get(key) != source[source_key]:
+                changes.append(f"{key}: {card.get(key)} -> {source[source_key]}")
+                card[key] = source[source_key]
 
+        if changes:
+            updated_count += 1
+            print(f"ID {card['id']} updated. Changes: {', '.join(changes)}")
 
+    print(f"Updated {updated_count} JP cards")
+    return my_cards
 
 
-def fetch_json_from_url(url: str) -> Dict:
-    """Fetch JSON data from URL"""
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
 
 
 
@@ -133,21 +172,25 @@ def get_deepl_api_key():
     """Get DeepL API key from environment variables"""
     return os.getenv('DEEPL_API_KEY')
 
+_translator: Optional[CardNameTranslator] = None
+
+def get_translator() -> CardNameTranslator:
+    """Shared translator with one DeepL client and the persistent translation cache"""
+    global _translator
+    if _translator is None:
+        deepl_api_key = get_deepl_api_key()
+        backend = DeepLBackend(deepl_api_key) if deepl_api_key else None
+        _translator = CardNameTranslator(backend)
+    return _translator
+
+def set_translator(translator: Optional[CardNameTranslator]):
+    """Replace the shared translator, e.g. with one using an offline backend"""
+    global _translator
+    _translator = translator
+
 def translate_jp_to_en(jp_text: str) -> str:
     """Translate JP text to English using DeepL API"""
-    deepl_api_key = get_deepl_api_key()
-    
-    if not deepl_api_key:
-        print("DeepL API key not found")
-        return ""
-    
-    try:
-        deepl_client = deepl.Translator(deepl_api_key)
-        result = deepl_client.translate_text(jp_text, target_lang="EN-US")
-        return result.text
-    except Exception as e:
-        print(f"DeepL translation failed: {e}")
-        return ""
+    return get_translator().translate(jp_text)
 
 
 
@@ -170,26 +213,8 @@ def get_birthday_card_name(jp_prefix: str) -> str:
 
 
 def calculate_en_release_time(jp_release_time_ms: int) -> int:
-    """Calculate EN release time based on JP release time and current timezone"""
-    if jp_release_time_ms == 0:
-        return 0
-    
-    jp_release_dt = datetime.fromtimestamp(jp_release_time_ms / 1000, tz=pytz.UTC)
-    
- 
-    en_release_dt = jp_release_dt.replace(year=jp_release_dt.year + 1)
-    
-
-    timezone = get_pst_pdt_status()
-    if timezone == "PDT":
-        # add 16 hours for PDT
-        en_release_dt = en_release_dt + timedelta(hours=16)
-    else:
-        # add 17 hours for PST
-        en_release_dt = en_release_dt + timedelta(hours=17)
-    
-    # Convert back to milliseconds
-    return int(en_release_dt.timestamp() * 1000)
+    """Calculate EN release time based on JP release time and the timezone at that date"""
+    return project_normal([jp_release_time_ms])[0]
 
 
 def get_character_name(character_id: int) -> str:
@@ -221,110 +246,114 @@ def convert_card_type(card_supply_id: int) -> str:
     return CARD_SUPPLY_MAPPINGS.get(card_supply_id, "permanent")
 
 
-def get_sub_unit(card_id: int) -> Optional[str]:
-    """Get sub_unit for Virtual Singer cards using event data"""
-    try:
-        event_cards = fetch_json_from_url(EVENT_CARDS_URL)
-        events = fetch_json_from_url("https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/events.json")
-        cards = fetch_json_from_url("https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/cards.json")
-        # Step 1: Find matching event card by cardId
-        matching_event_card = None
+class EventCardResolver:
+    """Event/card lookup tables for Virtual Singer enrichment, downloaded once per run"""
+
+    def __init__(self, event_cards: List[Dict] = None, event_deck_bonuses: List[Dict] = None,
+                 events: List[Dict] = None, cards: List[Dict] = None):
+        self._loaded = False
+        if event_cards is not None:
+            self._build(event_cards, event_deck_bonuses or [], events or [], cards or [])
+
+    def _load(self):
+        if self._loaded:
+            return
+        print("Loading event data for Virtual Singer cards...")
+        try:
+            data = {result.url: result.data for result in fetch_all(
+                [EVENT_CARDS_URL, EVENT_DECK_BONUSES_URL, EVENTS_URL, CARDS_URL])}
+        except Exception as e:
+            # give up for the rest of the run instead of downloading again for every VS card
+            print(f"Could not load event data for Virtual Singer cards: {e}")
+            self._build([], [], [], [])
+            return
+        self._build(data[EVENT_CARDS_URL], data[EVENT_DECK_BONUSES_URL],
+                    data[EVENTS_URL], data[CARDS_URL])
+
+    def _build(self, event_cards, event_deck_bonuses, events, cards):
+        # first entry wins, matching the order the master files list them in
+        self.event_card_by_card_id = {}
+        self.bonus_card_ids_by_event_id = {}
         for event_card in event_cards:
-            if event_card.get("cardId") == card_id:
-                matching_event_card = event_card
-                break
-        
-        if not matching_event_card:
+            self.event_card_by_card_id.setdefault(event_card.get("cardId"), event_card)
+            if event_card.get("bonusRate") == 20:
+                self.bonus_card_ids_by_event_id.setdefault(
+                    event_card.get("eventId"), []).append(event_card.get("cardId"))
+
+        self.deck_bonuses_by_event_id = {}
+        for bonus in event_deck_bonuses:
+            self.deck_bonuses_by_event_id.setdefault(bonus.get("eventId"), []).append(bonus)
+
+        self.event_by_id = {event.get("id"): event for event in events}
+        self.card_by_id = {card.get("id"): card for card in cards}
+        self._loaded = True
+
+    def get_event_id(self, card_id: int) -> Optional[int]:
+        self._load()
+        event_card = self.event_card_by_card_id.get(card_id)
+        if not event_card:
             return None
-            
-        # Step 2: Get eventId from the matching event card
-        event_id = matching_event_card.get("eventId")
+        return event_card.get("eventId")
+
+    def get_virtual_singer_char_id(self, card_id: int) -> Optional[int]:
+        event_id = self.get_event_id(card_id)
         if not event_id:
             return None
-        
-        # Step 3: Find matching event by eventId
-        matching_event = None
-        for event in events:
-            # For mixed events
-            if event.get("unit") == "none":
-                for ev in event_cards:
-                    if ev.get("eventId") == event_id and ev.get("bonusRate") == 20:
-                        for card in cards:
-                            if ev.get("cardId") == card.get("id"):
-                                character = get_character_name(card.get('characterId'))
-                                unit = get_unit_name(character)
-                                event_unit = unit
-                           
-                                return event_unit
-                            
-            elif event.get("id") == event_id:
-                matching_event = event
-                break
-        
-        if not matching_event:
+
+        # first 6 deck bonuses of the event, the VS one has gameCharacterUnitId > 20
+        for bonus in self.deck_bonuses_by_event_id.get(event_id, [])[:6]:
+            game_char_unit_id = bonus.get("gameCharacterUnitId", 0)
+            if game_char_unit_id > 20:
+                return game_char_unit_id
+        return None
+
+    def get_sub_unit(self, card_id: int) -> Optional[str]:
+        event_id = self.get_event_id(card_id)
+        if not event_id:
             return None
-            
-        # Step 4: Get unit from event and map it
-        event_unit = matching_event.get("unit")
-        return SUB_UNIT_MAPPINGS.get(event_unit)
-    
+
+        event = self.event_by_id.get(event_id)
+        if not event:
+            return None
+
+        # For mixed events, use the unit of the first bonus card
+        if event.get("unit") == "none":
+            for bonus_card_id in self.bonus_card_ids_by_event_id.get(event_id, []):
+                card = self.card_by_id.get(bonus_card_id)
+                if card:
+                    return get_unit_name(get_character_name(card.get("characterId")))
+            return None
+
+        return SUB_UNIT_MAPPINGS.get(event.get("unit"))
+
+
+def get_sub_unit(card_id: int, resolver: Optional[EventCardResolver] = None) -> Optional[str]:
+    """Get sub_unit for Virtual Singer cards using event data"""
+    try:
+        return (resolver or EventCardResolver()).get_sub_unit(card_id)
     except Exception:
         # If fails, return None
         return None
 
 
 
-def get_virtual_singer_char_id(card_id: int) -> Optional[int]:
+def get_virtual_singer_char_id(card_id: int, resolver: Optional[EventCardResolver] = None) -> Optional[int]:
 
     print("Getting Virtual Singer ID...")
     try:
-        # Fetch the required JSON files
-        event_cards = fetch_json_from_url(EVENT_CARDS_URL)
-        event_deck_bonuses = fetch_json_from_url(EVENT_DECK_BONUSES_URL)
-        
-        # Step 1: Find matching event card by cardId
-        matching_event_card = None
-        for event_card in event_cards:
-            if event_card.get("cardId") == card_id:
-                matching_event_card = event_card
-                print(matching_event_card)
-                break
-        
-        if not matching_event_card:
-            return None
-            
-        # Step 2: Get eventId from the matching event card
-        event_id = matching_event_card.get("eventId")
-        if not event_id:
-            return None
-            
-        # Step 3: Find first 5 matching event deck bonuses by eventId
-        matching_bonuses = []
-        for bonus in event_deck_bonuses:
-            if bonus.get("eventId") == event_id:
-                matching_bonuses.append(bonus)
-                if len(matching_bonuses) == 6:
-                    break
-        
-        # Step 4: Find the one with gameCharacterUnitId > 20
-        for bonus in matching_bonuses:
-            game_char_unit_id = bonus.get("gameCharacterUnitId", 0)
-            if game_char_unit_id > 20:
-                return game_char_unit_id
-            
-                
-        return None
+        return (resolver or EventCardResolver()).get_virtual_singer_char_id(card_id)
     except Exception:
         # If  fails, fall back to normal mapping
         return None
 
 
 
-def get_character_id(character_name: str, unit: str, card_id: int) -> int:
+def get_character_id(character_name: str, unit: str, card_id: int,
+                     resolver: Optional[EventCardResolver] = None) -> int:
     """Get character ID based on character name and unit"""
     # complex lookup first for VS
     if unit == "Virtual Singers":
-        virtual_char_id = get_virtual_singer_char_id(card_id)
+        virtual_char_id = get_virtual_singer_char_id(card_id, resolver)
         if virtual_char_id:
             return virtual_char_id
     
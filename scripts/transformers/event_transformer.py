@@ -1,43 +1,40 @@
 import json
-import requests
 import re
-import pytz
-from datetime import datetime, timedelta
-from typing import Dict, List
-from .common_transform import get_pst_pdt_status
+from typing import Dict, List, Optional
+from .projection import project_normal
 from .mappings import EVENT_UNIT_MAPPINGS
-
-
-def fetch_json_from_url(url: str) -> List[Dict]:
-    """Fetch JSON data from URL"""
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
-
-
-def update_event_ids(transformed_diff: List[Dict], banners: List[Dict]) -> List[Dict]:
-
-    event_sets = []
-    for event in transformed_diff:
-        cards = set(event.get('cards', []))
-        event_sets.append((event, cards))
-
-    for banner in reversed(banners):
-        banner_cards = set(banner.get("cards", []))
-
-        for ev, event_cards in event_sets:
-            common_cards = len(banner_cards & event_cards)
-            if common_cards >= 3:
-                banner["event_id"] = ev.get("id")
-                banner["keywords"] = ev.get("keywords")
+from .card_store import as_card_store
+from .banner_index import BannerCardIndex
+from ..fetch import fetch_json_from_url
+from ..metrics import timed
+
+
+@timed("events.update_event_ids")
+def update_event_ids(transformed_diff: List[Dict], banners: List[Dict],
+                     index: Optional[BannerCardIndex] = None) -> List[Dict]:
+    """Link every banner sharing at least 3 cards with a new event to that event"""
+    if index is None:
+        index = BannerCardIndex(banners)
+
+    # later events win, same as checking every event against every banner
+    for ev in transformed_diff:
+        for position in index.positions_sharing(ev.get("cards", []), 3):
+            banner = banners[position]
+            banner["event_id"] = ev.get("id")
+            banner["keywords"] = ev.get("keywords")
 
     return banners
 
 
 def update_en_events(en_diff: List[Dict], en_events: List[Dict]) -> List[Dict]:
-    lookup = {ev['id']: ev for ev in en_diff}
+    return apply_event_changes(en_diff, en_events)
 
-    for event in en_events:
+
+def apply_event_changes(diff: List[Dict], events: List[Dict]) -> List[Dict]:
+    """Copy name/start/end/close of upstream events onto the events with the same id"""
+    lookup = {ev['id']: ev for ev in diff}
+
+    for event in events:
         if event["id"] in lookup:
             print(f"Processing Event: {event['id']}")
             for key, value in lookup[event["id"]].items():
@@ -50,14 +47,16 @@ def update_en_events(en_diff: List[Dict], en_events: List[Dict]) -> List[Dict]:
                 elif key == "closedAt":
                     event["close"] = value
 
-    return en_events
+    return events
 
 
+@timed("events.transform_events")
 def transform_events(jp_diff: List[Dict], events: List[Dict], jp_cards: List[Dict], mode: str) -> List[Dict]:
     event_cards = fetch_json_from_url(
         "https://raw.githubusercontent.com/Sekai-World/sekai-master-db-diff/refs/heads/main/eventCards.json")
 
     events_diff = []
+    card_store = as_card_store(jp_cards)
 
     for event in jp_diff:
         id = event.get("id")
@@ -88,8 +87,7 @@ def transform_events(jp_diff: List[Dict], events: List[Dict], jp_cards: List[Dic
         if unit != "mixed":
 
             first_card_id = cards[0]
-            card_data = next(
-                (card for card in jp_cards if card["id"] == first_card_id), None)
+            card_data = card_store.get(first_card_id)
             character = card_data.get("character", "")
             parts = character.split(" ")
             first_name = parts[1]
@@ -107,30 +105,23 @@ def transform_events(jp_diff: List[Dict], events: List[Dict], jp_cards: List[Dic
         elif unit == "mixed":
             new_event["type"] = "Mixed Event"
 
-        if mode == "jp":
+        if mode in ("jp", "en"):
             events_diff.append(new_event)
 
-        elif mode == "en":
-            new_event["start"] = adjust_time_for_en(start)
-            new_event["end"] = adjust_time_for_en(end)
-            new_event["close"] = adjust_time_for_en(close)
-            events_diff.append(new_event)
+    if mode == "en":
+        # project every start/end/close in one batch
+        fields = ("start", "end", "close")
+        projected = iter(project_normal(event[field] for event in events_diff for field in fields))
+        for event in events_diff:
+            for field in fields:
+                event[field] = next(projected)
 
     return events_diff
 
 
 def adjust_time_for_en(jp_time_ms: int) -> int:
     """Add 1 year and timezone hours to JP time for EN timing"""
-    if jp_time_ms == 0:
-        return 0
-    jp_dt = datetime.fromtimestamp(jp_time_ms / 1000, tz=pytz.UTC)
-
-    en_dt = jp_dt.replace(year=jp_dt.year + 1)
-
-    additional_hours = 16 if get_pst_pdt_status() == "PDT" else 17
-    en_dt = en_dt + timedelta(hours=additional_hours)
-
-    return int(en_dt.timestamp() * 1000)
+    return project_normal([jp_time_ms])[0]
 
 
 def increment_focus_event_type(text):
@@ -0,0 +1,148 @@
+import calendar
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Tuple
+import pytz
+
+# EN runs one year behind JP. Normal releases land 16h (PDT) or 17h (PST) after the
+# JP time a year later, using the DST state of the projected date. Leap days map to Feb 28.
+# Lookups are table-driven for FIRST_YEAR..LAST_YEAR; later dates use the current US DST
+# rule directly and datetime arithmetic, so they stay correct, only slower.
+
+DAY_MS = 24 * 60 * 60 * 1000
+HOUR_MS = 60 * 60 * 1000
+PDT_OFFSET_MS = 16 * HOUR_MS
+PST_OFFSET_MS = 17 * HOUR_MS
+# rerun estimates end on the last day of the month at 12:00 GMT+8
+RERUN_END_UTC_MS = 4 * HOUR_MS
+RERUN_WINDOW_MS = 5 * DAY_MS
+
+FIRST_YEAR = 1970
+LAST_YEAR = 2100
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _ms(day: date) -> int:
+    return (day.toordinal() - _EPOCH_ORDINAL) * DAY_MS
+
+
+YEAR_STARTS: List[int] = [_ms(date(year, 1, 1)) for year in range(FIRST_YEAR, LAST_YEAR + 2)]
+# first day after the last day of each month, indexed by (year - FIRST_YEAR) * 12 + month - 1
+MONTH_ENDS: List[int] = [
+    _ms(date(year, month, 1)) + calendar.monthrange(year, month)[1] * DAY_MS
+    for year in range(FIRST_YEAR, LAST_YEAR + 1) for month in range(1, 13)
+]
+MONTH_STARTS: List[int] = [
+    _ms(date(year, month, 1))
+    for year in range(FIRST_YEAR, LAST_YEAR + 1) for month in range(1, 13)
+]
+
+
+def _nth_sunday(year: int, month: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(6 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _build_dst_table() -> Tuple[List[int], List[bool]]:
+    """US/Pacific transitions as (utc ms, DST in effect from then on)"""
+    pacific = pytz.timezone("US/Pacific")
+    epoch = datetime(1970, 1, 1)
+    times, is_dst = [], []
+    for moment, (_, dst, _) in zip(pacific._utc_transition_times, pacific._transition_info):
+        if moment.year < FIRST_YEAR:
+            continue
+        times.append(int((moment - epoch).total_seconds()) * 1000)
+        is_dst.append(bool(dst))
+
+    # pytz stops at 2037, extend with the current rule up to LAST_YEAR
+    last_year = pacific._utc_transition_times[-1].year
+    for year in range(last_year + 1, LAST_YEAR + 1):
+        start, end = _rule_transitions(year)
+        times.append(start)
+        is_dst.append(True)
+        times.append(end)
+        is_dst.append(False)
+    return times, is_dst
+
+
+def _rule_transitions(year: int) -> Tuple[int, int]:
+    """Current US rule: PDT from 2nd Sunday of March 2:00 PST to 1st Sunday of November 2:00 PDT (utc ms)"""
+    return _ms(_nth_sunday(year, 3, 2)) + 10 * HOUR_MS, _ms(_nth_sunday(year, 11, 1)) + 9 * HOUR_MS
+
+
+DST_TRANSITIONS, DST_STATES = _build_dst_table()
+# the table covers FIRST_YEAR to LAST_YEAR, later moments apply the current rule directly
+_DST_TABLE_END = YEAR_STARTS[-1]
+
+
+def is_pdt(utc_ms: int) -> bool:
+    """US/Pacific DST state at utc_ms. Moments before FIRST_YEAR count as PST."""
+    if utc_ms >= _DST_TABLE_END:
+        start, end = _rule_transitions((datetime(1970, 1, 1) + timedelta(milliseconds=utc_ms)).year)
+        return start <= utc_ms < end
+    position = bisect_right(DST_TRANSITIONS, utc_ms) - 1
+    return position >= 0 and DST_STATES[position]
+
+
+def add_year(utc_ms: int) -> int:
+    """Same UTC date and time one year later, Feb 29 becomes Feb 28"""
+    index = bisect_right(YEAR_STARTS, utc_ms) - 1
+    if index < 0 or index >= len(YEAR_STARTS) - 2:
+        return _add_year_slow(utc_ms)
+    year = FIRST_YEAR + index
+    offset = utc_ms - YEAR_STARTS[index]
+    # day 59 is Feb 29 in a leap year and Mar 1 otherwise
+    if offset >= 59 * DAY_MS:
+        leap, next_leap = calendar.isleap(year), calendar.isleap(year + 1)
+        if leap and not next_leap:
+            offset -= DAY_MS
+        elif next_leap and not leap:
+            offset += DAY_MS
+    return YEAR_STARTS[index + 1] + offset
+
+
+def _add_year_slow(utc_ms: int) -> int:
+    # outside the precomputed years, e.g. the 2099-12-31 end of permanent gachas
+    moment = datetime(1970, 1, 1) + timedelta(milliseconds=utc_ms)
+    try:
+        shifted = moment.replace(year=moment.year + 1)
+    except ValueError:
+        shifted = moment.replace(year=moment.year + 1, day=28)
+    return utc_ms + (shifted - moment) // timedelta(milliseconds=1)
+
+
+def project_normal(jp_times: Iterable[int]) -> List[int]:
+    """EN estimates for JP timestamps (ms), 0 stays 0"""
+    projected = []
+    for jp_time in jp_times:
+        if not jp_time:
+            projected.append(0)
+            continue
+        shifted = add_year(jp_time)
+        projected.append(shifted + (PDT_OFFSET_MS if is_pdt(shifted) else PST_OFFSET_MS))
+    return projected
+
+
+def project_rerun(jp_ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int, int, int]]:
+    """(en_start, en_end, rerun_start, rerun_end) for JP (start, end) pairs of rerun banners"""
+    projected = []
+    for jp_start, jp_end in jp_ranges:
+        if not jp_start or not jp_end:
+            projected.append((0, 0, 0, 0))
+            continue
+        shifted_start = add_year(jp_start)
+        month = bisect_right(MONTH_STARTS, shifted_start) - 1
+        if 0 <= month < len(MONTH_STARTS) - 1:
+            en_end = MONTH_ENDS[month] - DAY_MS + RERUN_END_UTC_MS
+        else:
+            moment = datetime(1970, 1, 1) + timedelta(milliseconds=shifted_start)
+            last_day = date(moment.year, moment.month, calendar.monthrange(moment.year, moment.month)[1])
+            en_end = _ms(last_day) + RERUN_END_UTC_MS
+        projected.append((
+            en_end,
+            en_end,
+            shifted_start - RERUN_WINDOW_MS,
+            add_year(jp_end) + RERUN_WINDOW_MS,
+        ))
+    return projected
@@ -0,0 +1,107 @@
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional
+import deepl
+from .. import json_codec, metrics
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+
+TRANSLATION_CACHE_FILE = os.path.join(parent_dir, "data", "cache", "translations.json")
+DEFAULT_TARGET_LANG = "EN-US"
+# DeepL accepts up to 50 texts per translate_text request
+BATCH_SIZE = 50
+
+
+class DeepLBackend:
+    """Translation backend using one shared DeepL client"""
+
+    def __init__(self, api_key: str):
+        self.client = deepl.Translator(api_key)
+
+    def translate_batch(self, texts: List[str], target_lang: str) -> List[str]:
+        results = self.client.translate_text(texts, target_lang=target_lang)
+        return [result.text for result in results]
+
+
+class CardNameTranslator:
+    """Translates JP text through a pluggable backend, backed by a persistent cache.
+
+    A backend is any object with translate_batch(texts, target_lang) -> List[str].
+    """
+
+    def __init__(self, backend=None, cache_path: Optional[str] = TRANSLATION_CACHE_FILE,
+                 target_lang: str = DEFAULT_TARGET_LANG):
+        self.backend = backend
+        self.cache_path = cache_path
+        self.target_lang = target_lang
+        self.hits = 0
+        self.misses = 0
+        self._cache = self._load_cache()
+
+    def _load_cache(self) -> Dict[str, Dict[str, str]]:
+        if not self.cache_path:
+            return {}
+        try:
+            return json_codec.load_path(self.cache_path)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        # unique temp name, two runs may save the cache at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json_codec.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def translate_many(self, texts: Iterable[str]) -> Dict[str, str]:
+        """Translate every text, sending only uncached ones to the backend in batches"""
+        cached = self._cache.setdefault(self.target_lang, {})
+        results = {}
+        pending = []
+        seen = set()
+        for text in texts:
+            if not text or text in seen:
+                continue
+            seen.add(text)
+            if text in cached:
+                self.hits += 1
+                metrics.count("translation_cache_hits")
+                results[text] = cached[text]
+            else:
+                self.misses += 1
+                metrics.count("translation_cache_misses")
+                pending.append(text)
+
+        if pending:
+            if self.backend is None:
+                print("DeepL API key not found")
+                return results
+            try:
+                for i in range(0, len(pending), BATCH_SIZE):
+                    batch = pending[i:i + BATCH_SIZE]
+                    for text, translated in zip(batch, self.backend.translate_batch(batch, self.target_lang)):
+                        cached[text] = translated
+                        results[text] = translated
+            except Exception as e:
+                print(f"DeepL translation failed: {e}")
+            self.save()
+
+        return results
+
+    def translate(self, text: str) -> str:
+        if not text:
+            return ""
+        return self.translate_many([text]).get(text, "")
+
+    def report(self):
+        print(f"Translations: {self.hits} cache hits, {self.misses} misses")
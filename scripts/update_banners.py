@@ -1,43 +1,42 @@
-import json
-import os
-from .transformers.banner_transformer import transform_diff, update_en_banners
-from .common_update import load_json
+from typing import Optional
+from .transformers.banner_transformer import transform_diff, update_en_banners, apply_banner_changes
+from .pipeline import PipelineContext
+from .estimates import forget_estimates, remember_estimates
+from . import metrics
 
 
-def update_banners():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    parent_dir = os.path.dirname(current_dir)
-    data_dir = os.path.join(parent_dir, "data")
-    diff_dir = os.path.join(data_dir, "diff")
+def update_banners(ctx: Optional[PipelineContext] = None):
+    standalone = ctx is None
+    if standalone:
+        ctx = PipelineContext.from_diff_dir()
 
-    jp_diff_file = os.path.join(diff_dir, "jp_banners_diff.json")
-    en_diff_file = os.path.join(diff_dir, "en_banners_diff.json")
-
-    if not os.path.exists(jp_diff_file) and not os.path.exists(en_diff_file):
-        print("No banner diff files found, stopping execution")
+    if not ctx.has_diff("jp_banners_diff", "en_banners_diff", "jp_banners_modified", "en_banners_modified"):
+        print("No banner diffs found, stopping execution")
         return
 
-    def load_json_with_check(path):
-        if not os.path.exists(path):
-            print(f"Banner diff file not found: {path}, using empty array")
-            return []
-        return load_json(path)
-
-    jp_diff = load_json_with_check(jp_diff_file)
-    en_diff = load_json_with_check(en_diff_file)
+    jp_diff = ctx.diff("jp_banners_diff")
+    jp_modified = ctx.diff("jp_banners_modified")
+    # update_en_banners updates existing banners by sekai_id, so changed EN gachas share its path
+    en_diff = ctx.diff("en_banners_diff") + ctx.diff("en_banners_modified")
 
-    if len(jp_diff) == 0 and len(en_diff) == 0:
-        print("No differences found in banner diff files, stopping execution")
+    if len(jp_diff) == 0 and len(en_diff) == 0 and len(jp_modified) == 0:
+        print("No differences found in banner diffs, stopping execution")
         return
 
-    en_banners = load_json("en_banners.json")
-    jp_banners = load_json("jp_banners.json")
+    metrics.count("records_processed", len(jp_diff) + len(en_diff) + len(jp_modified))
 
-    jp_cards = load_json("cards.json")
+    en_banners = ctx.get("en_banners")
+    jp_banners = ctx.get("jp_banners")
+
+    jp_cards = ctx.card_store
 
     jp_final = jp_banners.copy()  # Start with originals
     en_final = en_banners.copy()  # Start with originals
 
+    if len(jp_modified) >= 1:
+        print(f"Applying {len(jp_modified)} changed JP gachas")
+        apply_banner_changes(jp_modified, jp_final, jp_cards)
+
     if len(jp_diff) >= 1:
         print(f"Processing {len(jp_diff)} JP diff items")
         print(f"Original JP banners count: {len(jp_banners)}")
@@ -83,17 +82,18 @@ def update_banners():
                 print(f"Skipped JP banner with sekai_id {sekai_id} - already exists")
 
         # Add only new EN banners (not already present in ORIGINAL)  
-        added_en_count = 0
+        added_en_banners = []
         for new_banner in transformed_en_banners:
             sekai_id = new_banner.get('sekai_id')
             if sekai_id not in existing_en_sekai_ids:
                 en_final.append(new_banner)
-                added_en_count += 1
+                added_en_banners.append(new_banner)
                 print(f"Added EN banner with sekai_id {sekai_id}")
             else:
                 print(f"Skipped EN banner with sekai_id {sekai_id} - already exists")
 
-        print(f"Added {added_jp_count} JP banners, {added_en_count} EN banners")
+        remember_estimates("en_banners", added_en_banners)
+        print(f"Added {added_jp_count} JP banners, {len(added_en_banners)} EN banners")
         print(f"Final JP count: {len(jp_final)}")
         print(f"Final EN count: {len(en_final)}")
 
@@ -101,18 +101,14 @@ def update_banners():
         print(f"Processing {len(en_diff)} EN diff items")
         # Update en_banners using en source
         en_final = update_en_banners(en_diff, en_final, jp_cards)
+        # the EN gachas set the times of every banner with their sekai_id, reruns included
+        en_sekai_ids = {banner.get("id") for banner in en_diff}
+        forget_estimates("en_banners", (banner.get("id") for banner in en_final
+                                        if banner.get("sekai_id") in en_sekai_ids))
         print(f"EN final count after EN diff: {len(en_final)}")
 
-    try:
-        with open("jp_banners.json", 'w', encoding='utf-8') as f:
-            json.dump(jp_final, f, indent=2, ensure_ascii=False)
-        print(f"JP banners saved successfully. Count: {len(jp_final)}")
-    except Exception as e:
-        print(f"Error saving JP banners: {e}")
-
-    try:
-        with open("en_banners.json", 'w', encoding='utf-8') as g:
-            json.dump(en_final, g, indent=2, ensure_ascii=False)
-        print(f"EN banners saved successfully. Count: {len(en_final)}")
-    except Exception as e:
-        print(f"Error saving EN banners: {e}")
\ No newline at end of file
+    if len(jp_diff) >= 1 or len(jp_modified) >= 1:
+        ctx.set("jp_banners", jp_final)
+    ctx.set("en_banners", en_final)
+    if standalone:
+        ctx.flush()
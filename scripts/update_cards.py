@@ -1,59 +1,49 @@
-import json
-import os
-from .transformers.cards_transformer import transform_diff, update_en_cards
-from .common_update import load_json
-
-def update_cards():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    parent_dir = os.path.dirname(current_dir)
-    data_dir = os.path.join(parent_dir,"data")
-
-    en_diff_file = os.path.join(data_dir,"diff","en_cards_diff.json")
-    jp_diff_file = os.path.join(data_dir, "diff", "jp_cards_diff.json")
-
-    if not os.path.exists(jp_diff_file) and not os.path.exists(en_diff_file):
-        print("No card diff files found, stopping execution")
+from typing import Optional
+from .transformers.cards_transformer import transform_diff, update_en_cards, update_jp_cards
+from .pipeline import PipelineContext
+from .estimates import forget_estimates, remember_estimates
+from . import metrics
+
+def update_cards(ctx: Optional[PipelineContext] = None):
+    standalone = ctx is None
+    if standalone:
+        ctx = PipelineContext.from_diff_dir()
+
+    if not ctx.has_diff("jp_cards_diff", "en_cards_diff", "jp_cards_modified", "en_cards_modified"):
+        print("No card diffs found, stopping execution")
         return
 
+    jp_diff = ctx.diff("jp_cards_diff")
+    jp_modified = ctx.diff("jp_cards_modified")
+    # EN updates are applied by id, so changed EN cards go through the same path as new ones
+    en_diff = ctx.diff("en_cards_diff") + ctx.diff("en_cards_modified")
 
-    def load_json_with_check(path):
-        if not os.path.exists(path):
-            print(f"Card diff file not found: {path}, using empty array")
-            return []
-        return load_json(path)
 
-    jp_diff = load_json_with_check(jp_diff_file)
-    en_diff = load_json_with_check(en_diff_file)
-
-
-    if len(jp_diff) == 0 and len(en_diff) == 0:
-        print("No differences found in card diff files, stopping execution")
+    if len(jp_diff) == 0 and len(en_diff) == 0 and len(jp_modified) == 0:
+        print("No differences found in card diffs, stopping execution")
         return
 
-    with open('cards.json', 'r', encoding='utf-8') as c:
-        my_cards = json.load(c)
+    metrics.count("records_processed", len(jp_diff) + len(en_diff) + len(jp_modified))
 
-    my_cards_file = os.path.join(parent_dir, "cards.json")
+    card_store = ctx.card_store
 
-    final_cards = my_cards
+    if len(jp_modified) >= 1:
+        update_jp_cards(card_store.cards, jp_modified)
 
     if len(jp_diff) >= 1:
         transformed_jp_diff = transform_diff(jp_diff, mode="jp")
-    
-        final_cards = final_cards + transformed_jp_diff  
-        
-        with open(jp_diff_file, 'w', encoding='utf-8') as f:
-            json.dump(transformed_jp_diff, f, indent=2, ensure_ascii=False)
+
+        card_store.upsert(transformed_jp_diff)
+        remember_estimates("cards", transformed_jp_diff)
 
     if len(en_diff) >= 1:
         transformed_en_diff = transform_diff(en_diff, mode="en")
-        final_cards = update_en_cards(final_cards, transformed_en_diff)
+        update_en_cards(card_store.cards, transformed_en_diff)
+        forget_estimates("cards", (card.get("id") for card in en_diff))
         print("EN cards updated")
-        
-        with open(en_diff_file, 'w', encoding='utf-8') as f:
-            json.dump(transformed_en_diff, f, indent=2, ensure_ascii=False)
 
-    with open(my_cards_file, 'w', encoding='utf-8') as f:
-        json.dump(final_cards, f, indent=2, ensure_ascii=False)
+    ctx.mark_dirty("cards")
+    if standalone:
+        ctx.flush()
 
-    print(f"Final merged data saved. Total cards: {len(final_cards)}")
\ No newline at end of file
+    print(f"Final merged data ready. Total cards: {len(card_store)}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the pipeline is run from the repository root as "scripts.*", make that importable here too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
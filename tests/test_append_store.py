@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from scripts import append_store, common_update, json_writer
+from scripts.common_update import write_json_if_changed
+from scripts.pipeline import PipelineContext
+
+RECORDS = [{"id": 1, "name": "初音ミク", "cards": [1, 2]}, {"id": 2, "name": "Rin", "cards": []}]
+NEW_RECORDS = [{"id": 3, "name": "Len", "cards": [3]}, {"id": 4, "name": "Luka", "cards": [4, 5]}]
+
+
+@pytest.fixture(autouse=True)
+def cache_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(append_store, "LAYOUT_FILE", str(tmp_path / "cache" / "append_layout.json"))
+    monkeypatch.setattr(append_store, "JOURNAL_FILE", str(tmp_path / "cache" / "append_journal.json"))
+
+
+@pytest.fixture
+def output(tmp_path):
+    path = tmp_path / "cards.json"
+    write_json_if_changed(str(path), RECORDS)
+    append_store.remember_layout(str(path))
+    return path
+
+
+def journal():
+    try:
+        with open(append_store.JOURNAL_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def test_append_matches_full_rewrite(output):
+    assert append_store.append_records(str(output), NEW_RECORDS, RECORDS[-1])
+
+    assert output.read_bytes() == json_writer.dumps(RECORDS + NEW_RECORDS).encode("utf-8")
+    assert append_store.has_writer_layout(str(output))
+    assert journal() == {}
+
+
+def test_no_append_to_changed_file(output):
+    output.write_bytes(output.read_bytes().replace(b"Rin", b"Ren"))
+    assert not append_store.has_writer_layout(str(output))
+    assert not append_store.append_records(str(output), NEW_RECORDS, RECORDS[-1])
+
+    # same bytes as last written but a fresh mtime, e.g. after a checkout: still appendable
+    write_json_if_changed(str(output), RECORDS)
+    assert append_store.append_records(str(output), NEW_RECORDS, RECORDS[-1])
+
+
+def test_no_append_on_unexpected_tail(output):
+    assert not append_store.append_records(str(output), NEW_RECORDS, {"id": 99})
+    assert output.read_bytes() == json_writer.dumps(RECORDS).encode("utf-8")
+
+
+def test_interrupted_append_is_rolled_back(output, monkeypatch):
+    before = output.read_bytes()
+
+    def crash(path, offset, content):
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(content[:len(content) // 2])
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(append_store, "_write_tail", crash)
+    with pytest.raises(KeyboardInterrupt):
+        append_store.append_records(str(output), NEW_RECORDS, RECORDS[-1])
+    with pytest.raises(ValueError):
+        json.loads(output.read_bytes())
+    assert str(output) in journal()
+
+    assert append_store.recover_append(str(output))
+    assert output.read_bytes() == before
+    assert append_store.has_writer_layout(str(output))
+    assert journal() == {}
+
+
+def test_completed_append_is_kept(output, monkeypatch):
+    def crash(path, content=None):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(append_store, "remember_layout", crash)
+    with pytest.raises(KeyboardInterrupt):
+        append_store.append_records(str(output), NEW_RECORDS, RECORDS[-1])
+    appended = output.read_bytes()
+
+    assert not append_store.recover_append(str(output))
+    assert output.read_bytes() == appended == json_writer.dumps(RECORDS + NEW_RECORDS).encode("utf-8")
+    assert journal() == {}
+
+
+def test_stale_journal_leaves_file_alone(output):
+    # a journal restored with data/cache that describes some other content
+    append_store._update_entry(append_store.JOURNAL_FILE, str(output), [10, "0" * 40, 20, "1" * 40])
+    before = output.read_bytes()
+
+    assert not append_store.recover_append(str(output))
+    assert output.read_bytes() == before
+    assert journal() == {}
+
+
+def test_context_recovers_before_loading(tmp_path, monkeypatch):
+    monkeypatch.setattr(common_update, "PARSED_CACHE_DIR", str(tmp_path / "cache" / "parsed"))
+    ctx = PipelineContext(str(tmp_path))
+    path = ctx.output_path("cards")
+    write_json_if_changed(path, RECORDS)
+    append_store.remember_layout(path)
+
+    def crash(path, offset, content):
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(content[:5])
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(append_store, "_write_tail", crash)
+    with pytest.raises(KeyboardInterrupt):
+        append_store.append_records(path, NEW_RECORDS, RECORDS[-1])
+
+    assert ctx.get("cards") == RECORDS
@@ -0,0 +1,47 @@
+import pytest
+
+from scripts.common import UnorderedInput, get_json_differences, merge_diff
+
+OLD = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 4, "name": "d"}]
+NEW = [{"id": 2, "name": "B"}, {"id": 3, "name": "c"}, {"id": 4, "name": "d"}, {"id": 5, "name": "e"}]
+
+
+def test_merge_diff_joins_by_key():
+    changes = [(change, old and old["id"], new and new["id"]) for change, old, new in merge_diff(OLD, NEW)]
+
+    assert changes == [
+        ("delete", 1, None),
+        ("update", 2, 2),
+        ("insert", None, 3),
+        ("same", 4, 4),
+        ("insert", None, 5),
+    ]
+
+
+def test_merge_diff_reads_both_sides_lazily():
+    consumed = []
+
+    def stream(records):
+        for record in records:
+            consumed.append(record["id"])
+            yield record
+
+    changes = merge_diff(stream(OLD[:1]), stream(NEW[:1]))
+    assert next(changes)[0] == "delete"
+    assert consumed == [1, 2]
+
+
+@pytest.mark.parametrize("old, new", [
+    (OLD, NEW[::-1]),
+    (OLD[::-1], NEW),
+    (OLD, NEW[:1] + NEW[:1]),
+    (OLD, [{"id": 1}, {"id": "2"}]),
+])
+def test_merge_diff_rejects_unsorted_sides(old, new):
+    with pytest.raises(UnorderedInput):
+        list(merge_diff(old, new))
+
+
+def test_get_json_differences_accepts_any_order():
+    assert get_json_differences(OLD, NEW) == NEW[1:2] + NEW[3:]
+    assert get_json_differences(OLD[::-1], NEW[::-1]) == NEW[3:] + NEW[1:2]
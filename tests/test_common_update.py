@@ -0,0 +1,52 @@
+import os
+
+from scripts import common_update
+from scripts.common_update import MTIME_RESOLUTION_NS, load_json, load_optional_json
+from scripts.metrics import MetricsRecorder
+
+
+def test_load_optional_json_is_quiet(tmp_path, capsys):
+    missing = str(tmp_path / "missing.json")
+    broken = tmp_path / "broken.json"
+    broken.write_text('{"a": ', encoding="utf-8")
+    present = tmp_path / "stamps.json"
+    present.write_text('{"cards": [1, 2]}', encoding="utf-8")
+
+    assert load_optional_json(missing, {}) == {}
+    assert load_optional_json(str(broken), {}) == {}
+    assert load_optional_json(str(present), {}) == {"cards": [1, 2]}
+    assert capsys.readouterr().out == ""
+
+    # outputs and master files still report a missing file
+    assert load_json(missing, fallback_value={}) == {}
+    assert "File not found" in capsys.readouterr().out
+
+
+def test_parsed_cache_checks_content_written_within_mtime_resolution(tmp_path, monkeypatch):
+    monkeypatch.setattr(common_update, "PARSED_CACHE_DIR", str(tmp_path / "cache" / "parsed"))
+    path = tmp_path / "cards.json"
+    path.write_text('[{"id": 1}]', encoding="utf-8")
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    assert load_json(str(path)) == [{"id": 1}]
+    # rewritten at the same size within the same timestamp tick: the mtime does not move
+    path.write_text('[{"id": 2}]', encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    assert load_json(str(path)) == [{"id": 2}]
+
+
+def test_parsed_cache_trusts_mtime_of_files_older_than_the_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(common_update, "PARSED_CACHE_DIR", str(tmp_path / "cache" / "parsed"))
+    path = tmp_path / "cards.json"
+    path.write_text('[{"id": 1}]', encoding="utf-8")
+    old_ns = os.stat(path).st_mtime_ns - 2 * MTIME_RESOLUTION_NS
+    os.utime(path, ns=(old_ns, old_ns))
+    load_json(str(path))
+    # same size and mtime long before the entry was written: the file is not read again,
+    # so a change that kept both goes unnoticed
+    path.write_text('[{"id": 2}]', encoding="utf-8")
+    os.utime(path, ns=(old_ns, old_ns))
+
+    with MetricsRecorder(trace_memory=False) as recorder:
+        assert load_json(str(path)) == [{"id": 1}]
+    assert recorder.totals()["parsed_cache_hits"] == 1
@@ -0,0 +1,18 @@
+from scripts.transformers import cards_transformer
+from scripts.transformers.cards_transformer import EventCardResolver
+
+
+def test_failed_download_is_not_retried(monkeypatch):
+    calls = []
+
+    def failing_fetch_all(urls, *args, **kwargs):
+        calls.append(urls)
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(cards_transformer, "fetch_all", failing_fetch_all)
+    resolver = EventCardResolver()
+
+    for card_id in (1, 2, 3):
+        assert resolver.get_virtual_singer_char_id(card_id) is None
+        assert resolver.get_sub_unit(card_id) is None
+    assert len(calls) == 1
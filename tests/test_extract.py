@@ -0,0 +1,176 @@
+import json
+import os
+
+import pytest
+
+from scripts import extract
+from scripts.common_update import write_json_if_changed
+from scripts.fetch import FetchResult
+from scripts.metrics import MetricsRecorder
+from scripts.pipeline import PipelineContext
+
+
+def test_failed_download_leaves_every_snapshot_alone(monkeypatch):
+    diffed = []
+
+    def fetch_all(urls, *args, **kwargs):
+        for url in urls[:-1]:
+            yield FetchResult(url, None, 200, 2, 0.0, b"[]")
+        raise ConnectionError("en_events: 502")
+
+    monkeypatch.setattr(extract, "fetch_all", fetch_all)
+    monkeypatch.setattr(extract, "diff_snapshot", lambda *args, **kwargs: diffed.append(args))
+
+    with pytest.raises(ConnectionError):
+        extract.extract_and_diff("sekai")
+    assert diffed == []
+
+
+OLD = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+NEW = [{"id": 1, "name": "a"}, {"id": 2, "name": "B"}, {"id": 3, "name": "c"}]
+
+
+def _staged_diff(tmp_path):
+    snapshot = tmp_path / "jp_cards_extracted.json"
+    write_json_if_changed(str(snapshot), OLD, indent=4)
+    ctx = PipelineContext(str(tmp_path))
+    pending = []
+    assert extract.diff_snapshot(NEW, str(snapshot), str(tmp_path), "jp_cards", ctx, None, pending)
+    for commit, discard in pending:
+        ctx.defer(commit, discard)
+    return ctx, snapshot
+
+
+def test_snapshot_moves_on_only_when_flushed(tmp_path):
+    ctx, snapshot = _staged_diff(tmp_path)
+
+    assert json.loads(snapshot.read_bytes()) == OLD
+    assert ctx.diffs == {"jp_cards_diff": [NEW[2]], "jp_cards_modified": [NEW[1]]}
+
+    ctx.flush()
+    assert json.loads(snapshot.read_bytes()) == NEW
+    assert not [path for path in os.listdir(tmp_path) if path.startswith(".tmp-")]
+
+
+def test_failed_run_keeps_snapshot(tmp_path):
+    ctx, snapshot = _staged_diff(tmp_path)
+
+    ctx.discard_pending()
+    ctx.flush()
+    assert json.loads(snapshot.read_bytes()) == OLD
+    assert not [path for path in os.listdir(tmp_path) if path.startswith(".tmp-")]
+
+
+def test_unchanged_upstream_files_are_not_diffed_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract, "DIFF_STAMPS_FILE", str(tmp_path / "diff_stamps.json"))
+    cached = tmp_path / "body.json"
+    cached.write_bytes(b"[]")
+    validator = ['"v1"', None]
+    diffed = []
+
+    def run(status, validator):
+        def fetch_all(urls, *args, **kwargs):
+            for url in urls:
+                if status == 304:
+                    yield FetchResult(url, None, 304, 0, 0.0, validator=validator, body_path=str(cached))
+                else:
+                    yield FetchResult(url, None, 200, 2, 0.0, b"[]", validator)
+
+        monkeypatch.setattr(extract, "fetch_all", fetch_all)
+        diffed.clear()
+        extract.extract_and_diff("sekai")
+        return [args[3] for args in diffed]
+
+    monkeypatch.setattr(extract, "diff_snapshot", lambda *args, **kwargs: diffed.append(args))
+
+    assert len(run(200, validator)) == 6
+    assert run(304, validator) == []
+    # a 304 for a body that was never diffed, e.g. after a failed run
+    assert len(run(304, ['"v2"', None])) == 6
+
+
+def _snapshot(tmp_path, records):
+    snapshot = tmp_path / "jp_cards_extracted.json"
+    write_json_if_changed(str(snapshot), records, indent=4)
+    return snapshot
+
+
+def _commit(pending):
+    for commit, _ in pending:
+        commit()
+
+
+def _temp_files(tmp_path):
+    return [path for path in os.listdir(tmp_path) if path.startswith(".tmp-")]
+
+
+@pytest.mark.parametrize("old, new", [(OLD, NEW[::-1]), (OLD[::-1], NEW)])
+def test_unsorted_records_fall_back_to_the_hash_diff(tmp_path, old, new):
+    snapshot = _snapshot(tmp_path, old)
+    ctx = PipelineContext(str(tmp_path))
+    pending = []
+
+    with MetricsRecorder(trace_memory=False) as recorder:
+        # callable: the fallback reads the new records a second time
+        assert extract.diff_snapshot(lambda: iter(new), str(snapshot), str(tmp_path), "jp_cards",
+                                     ctx, None, pending)
+
+    assert recorder.totals()["unordered_diff_fallbacks"] == 1
+    assert ctx.diffs == {"jp_cards_diff": [NEW[2]], "jp_cards_modified": [NEW[1]]}
+    # the merge join stopped half way, its staged snapshot is gone
+    assert not _temp_files(tmp_path)
+    assert json.loads(snapshot.read_bytes()) == old
+
+    _commit(pending)
+    assert sorted(json.loads(snapshot.read_bytes()), key=lambda record: record["id"]) == NEW
+    hashes = json.loads((tmp_path / "jp_cards_hashes.json").read_bytes())
+    assert sorted(hashes) == ["1", "2", "3"]
+
+
+def test_merge_removes_the_stale_hash_index(tmp_path):
+    snapshot = _snapshot(tmp_path, OLD)
+    hashes = tmp_path / "jp_cards_hashes.json"
+    hashes.write_text(json.dumps({"1": "x", "2": "y"}))
+    pending = []
+
+    assert extract.merge_snapshot(iter(NEW[:1]), str(snapshot), None, pending) == ([], [], ["2"])
+    assert hashes.exists()
+
+    _commit(pending)
+    assert json.loads(snapshot.read_bytes()) == NEW[:1]
+    assert not hashes.exists()
+
+
+def test_unchanged_snapshot_is_left_alone(tmp_path):
+    snapshot = _snapshot(tmp_path, OLD)
+    pending = []
+
+    assert extract.merge_snapshot(iter(OLD), str(snapshot), None, pending) == ([], [], [])
+    assert pending == []
+    assert not _temp_files(tmp_path)
+
+
+CARD = {"id": 1, "characterId": 6, "attr": "cool", "releaseAt": 1759244400000}
+
+
+@pytest.mark.parametrize("diff", [extract.merge_snapshot, extract.hash_diff_snapshot])
+def test_snapshot_with_dropped_fields_is_rewritten(tmp_path, diff):
+    # written before the cards projection stopped keeping assetbundleName
+    snapshot = _snapshot(tmp_path, [dict(CARD, assetbundleName="res006_no001")])
+    pending = []
+
+    assert diff(iter([CARD]), str(snapshot), "cards", pending) == ([], [], [])
+
+    _commit(pending)
+    assert json.loads(snapshot.read_bytes()) == [CARD]
+
+
+def test_reshaped_snapshot_without_upstream_data_is_kept(tmp_path):
+    stored = [dict(CARD, assetbundleName="res006_no001")]
+    snapshot = _snapshot(tmp_path, stored)
+    pending = []
+
+    assert extract.diff_snapshot([], str(snapshot), str(tmp_path), "jp_cards", None, "cards", pending) is False
+    _commit(pending)
+    assert json.loads(snapshot.read_bytes()) == stored
+    assert not _temp_files(tmp_path)
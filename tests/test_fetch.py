@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts import fetch
+from scripts.metrics import MetricsRecorder
+
+BODY = json.dumps([{"id": 1, "name": "テスト"}, {"id": 2, "name": "cards"}]).encode("utf-8")
+ETAG = '"v1"'
+LAST_MODIFIED = "Sat, 04 Oct 2025 00:00:00 GMT"
+
+
+class MasterFileHandler(BaseHTTPRequestHandler):
+    """Stand-in for raw.githubusercontent.com: one JSON file with ETag/Last-Modified validators"""
+
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    MasterFileHandler.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MasterFileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/cards.json"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_parsed_bodies(monkeypatch):
+    monkeypatch.setattr(fetch, "_parsed_bodies", {})
+
+
+def test_first_fetch_stores_body_and_validators(server_url, tmp_path):
+    result = fetch.fetch_json_with_stats(server_url, str(tmp_path))
+
+    assert result.status == 200
+    assert result.size == len(BODY)
+    assert result.data == json.loads(BODY)
+    body_path, meta_path = fetch._cache_paths(server_url, str(tmp_path))
+    with open(body_path, "rb") as f:
+        assert f.read() == BODY
+    with open(meta_path, "rb") as f:
+        assert json.load(f) == {"url": server_url, "etag": ETAG, "last_modified": LAST_MODIFIED}
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".tmp-")]
+
+
+def test_not_modified_reuses_parsed_body(server_url, tmp_path):
+    first = fetch.fetch_json_with_stats(server_url, str(tmp_path))
+    with MetricsRecorder(trace_memory=False) as recorder:
+        second = fetch.fetch_json_with_stats(server_url, str(tmp_path))
+
+    assert MasterFileHandler.requests_seen[-1]["If-None-Match"] == ETAG
+    assert MasterFileHandler.requests_seen[-1]["If-Modified-Since"] == LAST_MODIFIED
+    assert second.status == 304
+    assert second.size == 0
+    # the body parsed by the first request is handed out again
+    assert second.data is first.data
+    totals = recorder.totals()
+    assert totals["http_requests"] == 1
+    assert totals["http_not_modified"] == 1
+    assert totals["parsed_body_cache_hits"] == 1
+
+
+def test_not_modified_in_new_run_reads_cached_body(server_url, tmp_path):
+    fetch.fetch_json_with_stats(server_url, str(tmp_path))
+    # a later run starts without parsed bodies, only the disk cache is left
+    fetch._parsed_bodies.clear()
+    with MetricsRecorder(trace_memory=False) as recorder:
+        result = fetch.fetch_json_with_stats(server_url, str(tmp_path))
+        raw = fetch.fetch_json_with_stats(server_url, str(tmp_path), parse=False)
+
+    assert result.status == 304
+    assert result.data == json.loads(BODY)
+    assert raw.status == 304
+    assert raw.data is None
+    # not read from the cache until asked for
+    assert raw.body is None
+    assert raw.read_body() == BODY
+    assert raw.validator == result.validator == [ETAG, LAST_MODIFIED]
+    totals = recorder.totals()
+    assert totals["http_not_modified"] == 2
+    assert "parsed_body_cache_hits" not in totals
+
+
+def test_fetch_all_with_duplicate_urls(server_url, tmp_path):
+    results = list(fetch.fetch_all([server_url] * 8, str(tmp_path)))
+
+    assert len(results) == 8
+    assert all(result.data == json.loads(BODY) for result in results)
+    assert sorted(name for name in os.listdir(tmp_path)) == sorted(
+        os.path.basename(path) for path in fetch._cache_paths(server_url, str(tmp_path)))
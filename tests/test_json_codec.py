@@ -0,0 +1,118 @@
+import io
+import json
+import os
+
+import pytest
+
+from scripts import json_codec
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "json_codec")
+
+# slices of the files the pipeline writes, with the indent it writes them at
+FIXTURE_INDENTS = {
+    "cards.json": 2,
+    "jp_banners.json": 2,
+    "en_banners.json": 2,
+    "en_events.json": 2,
+    "jp_cards_extracted.json": 4,
+    "en_events_extracted.json": 4,
+}
+
+BACKENDS = ["json", pytest.param("orjson", marks=pytest.mark.skipif(
+    json_codec.orjson is None, reason="orjson is not installed"))]
+
+SAMPLE = [
+    {
+        "id": 1,
+        "name": "初音ミク",
+        "en": "Café “Sekai”\n",
+        "cards": [1, 2],
+        "grid": [[1, 2], [], ["a", None, True, 1.5]],
+        "keywords": [],
+        "extra": {},
+        "nested": {"ids": [3], "empty": []},
+    },
+    {},
+    [],
+]
+
+SAMPLE_TEXT = """[
+  {
+    "id": 1,
+    "name": "初音ミク",
+    "en": "Café “Sekai”\\n",
+    "cards": [1, 2],
+    "grid": [
+      [1, 2],
+      [],
+      ["a", null, true, 1.5]
+    ],
+    "keywords": [],
+    "extra": {},
+    "nested": {
+      "ids": [3],
+      "empty": []
+    }
+  },
+  {},
+  []
+]
+"""
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setattr(json_codec, "BACKEND", request.param)
+    return request.param
+
+
+def _read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURE_INDENTS))
+def test_fixtures_round_trip_byte_identical(name, backend):
+    expected = _read_fixture(name)
+    indent = FIXTURE_INDENTS[name]
+
+    data = json_codec.loads(expected)
+    assert json_codec.encode(data, indent) == expected
+
+    streamed = io.StringIO()
+    json_codec.dump_array(iter(data), streamed, indent)
+    assert streamed.getvalue().encode("utf-8") == expected
+
+
+def test_backends_parse_fixtures_alike():
+    if json_codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    for name in FIXTURE_INDENTS:
+        expected = _read_fixture(name)
+        assert json_codec.orjson.loads(expected) == json.loads(expected), name
+
+
+def test_sample_layout(backend):
+    encoded = json_codec.encode(SAMPLE)
+    assert encoded == SAMPLE_TEXT.encode("utf-8")
+    # parsing back and encoding again gives the same bytes
+    assert json_codec.encode(json_codec.loads(encoded)) == encoded
+    assert json_codec.loads(encoded) == json.loads(encoded)
+
+
+@pytest.mark.parametrize("value, text", [
+    ([], "[]\n"),
+    ({}, "{}\n"),
+    ([[]], "[\n  []\n]\n"),
+    ({"a": []}, '{\n  "a": []\n}\n'),
+    (["ミク", "リン"], '["ミク", "リン"]\n'),
+])
+def test_empty_and_scalar_containers(value, text, backend):
+    assert json_codec.encode(value) == text.encode("utf-8")
+    assert json_codec.loads(text) == value
+
+
+def test_encode_matches_dump(backend):
+    out = io.StringIO()
+    json_codec.dump(SAMPLE, out)
+    assert out.getvalue() == json_codec.dumps(SAMPLE) == SAMPLE_TEXT
@@ -0,0 +1,51 @@
+import io
+import json
+
+import pytest
+
+from scripts.json_stream import iter_array, projector, stream_extract
+
+ARRAYS = [
+    "[]",
+    "[0.1]",
+    "[1e5]",
+    "[-25000000000.0]",
+    "[1, 22, 3.5e-3, -0, 1.5E+10, 7]",
+    '[{"a": 1.25}, "x", true, false, null, [], {}]',
+    ' [ "ミク" , {"b": [1, 2.5, {"c": -3e-2}]} ] ',
+]
+
+GACHAS = [
+    {
+        "id": 838,
+        "gachaType": "ceil",
+        "name": "EYES ON MEガチャ",
+        "startAt": 1759546800000,
+        "endAt": 1760151599000,
+        "rate": 0.75,
+        "gachaPickups": [{"id": 1, "gachaId": 838, "cardId": 1254, "gachaPickupType": "normal"}],
+        "gachaDetails": [{"id": 2, "gachaId": 838, "cardId": 4, "weight": 1.5e-3}],
+    },
+    {"id": 839, "name": "★4メンバー確定ガチャ", "startAt": -1, "endAt": 4102340399000, "gachaPickups": []},
+]
+
+
+@pytest.mark.parametrize("text", ARRAYS)
+def test_iter_array_at_every_chunk_size(text):
+    expected = json.loads(text)
+    for chunk_size in range(1, len(text) + 1):
+        assert list(iter_array(io.StringIO(text), chunk_size)) == expected, chunk_size
+
+
+def test_stream_extract_at_every_chunk_size():
+    text = json.dumps(GACHAS, ensure_ascii=False)
+    expected = [projector("banner")(gacha) for gacha in GACHAS]
+    assert expected[0]["gachaDetails"] == [{"cardId": 4}]
+    for chunk_size in range(1, len(text) + 1):
+        assert list(stream_extract(io.StringIO(text), "banner", chunk_size)) == expected, chunk_size
+
+
+@pytest.mark.parametrize("text", ["{}", "[1 2]", "[1,", '["a"'])
+def test_iter_array_rejects_malformed_input(text):
+    with pytest.raises(ValueError):
+        list(iter_array(io.StringIO(text), 1))
@@ -0,0 +1,30 @@
+import tracemalloc
+
+from app import parse_args
+from scripts import metrics
+from scripts.metrics import MetricsRecorder
+
+
+def test_memory_tracing_is_off_by_default():
+    assert not parse_args([]).trace_memory
+    with MetricsRecorder() as recorder:
+        with recorder.stage("load"):
+            assert not tracemalloc.is_tracing()
+            metrics.count("bytes_read", 10)
+
+    report = recorder.report()
+    assert report["peak_memory_bytes"] is None
+    assert report["stages"][0]["peak_memory_bytes"] is None
+    assert report["totals"] == {"bytes_read": 10}
+
+
+def test_memory_tracing_on_request():
+    assert parse_args(["--trace-memory"]).trace_memory
+    with MetricsRecorder(trace_memory=True) as recorder:
+        with recorder.stage("load"):
+            assert tracemalloc.is_tracing()
+            data = [bytes(1000) for _ in range(100)]
+    del data
+
+    assert not tracemalloc.is_tracing()
+    assert recorder.report()["peak_memory_bytes"] >= 100 * 1000
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from scripts.transformers.projection import LAST_YEAR, is_pdt, project_normal
+
+PACIFIC = pytz.timezone("US/Pacific")
+HOUR_MS = 60 * 60 * 1000
+
+
+def utc_ms(*args) -> int:
+    return int((datetime(*args) - datetime(1970, 1, 1)).total_seconds()) * 1000
+
+
+@pytest.mark.parametrize("year", [2021, 2025, 2037])
+def test_dst_matches_pytz(year):
+    moment = datetime(year, 1, 1)
+    while moment.year == year:
+        expected = bool(PACIFIC.fromutc(moment).dst())
+        assert is_pdt(utc_ms(moment.year, moment.month, moment.day, moment.hour)) == expected, moment
+        moment += timedelta(hours=7)
+
+
+def nth_sunday(year: int, month: int, n: int) -> int:
+    first = datetime(year, month, 1)
+    return (first + timedelta(days=(6 - first.weekday()) % 7 + 7 * (n - 1))).day
+
+
+@pytest.mark.parametrize("year", [2038, LAST_YEAR, LAST_YEAR + 1, 2250])
+def test_dst_rule_past_pytz_data(year):
+    # 2nd Sunday of March 10:00 UTC to 1st Sunday of November 9:00 UTC
+    start, end = nth_sunday(year, 3, 2), nth_sunday(year, 11, 1)
+    assert not is_pdt(utc_ms(year, 3, start, 9, 59))
+    assert is_pdt(utc_ms(year, 3, start, 10))
+    assert is_pdt(utc_ms(year, 11, end, 8, 59))
+    assert not is_pdt(utc_ms(year, 11, end, 9))
+
+
+def test_project_normal_offsets():
+    assert project_normal([utc_ms(2025, 7, 1, 3), utc_ms(LAST_YEAR, 7, 1, 3), 0]) == [
+        utc_ms(2026, 7, 1, 3) + 16 * HOUR_MS,
+        utc_ms(LAST_YEAR + 1, 7, 1, 3) + 16 * HOUR_MS,
+        0,
+    ]
+    assert project_normal([utc_ms(2024, 2, 29, 3)]) == [utc_ms(2025, 2, 28, 3) + 17 * HOUR_MS]
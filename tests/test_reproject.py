@@ -0,0 +1,130 @@
+import json
+
+import pytest
+
+from scripts import estimates
+from scripts.estimates import forget_estimates, load_estimates, remember_estimates
+from scripts.pipeline import PipelineContext
+from scripts.reproject import reproject, seed_estimates
+from scripts.transformers.projection import project_normal, project_rerun
+
+DAY_MS = 24 * 60 * 60 * 1000
+NOW = 1759536000000  # 2025-10-04
+JP_TIME = NOW - 200 * DAY_MS
+STALE = NOW + 30 * DAY_MS  # an estimate made with older projection rules
+
+
+@pytest.fixture(autouse=True)
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(estimates, "ESTIMATES_FILE", str(tmp_path / "cache" / "en_estimates.json"))
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    ctx = PipelineContext(str(tmp_path))
+    ctx.set("cards", [
+        {"id": 1, "jp_released": JP_TIME, "en_released": STALE},
+        {"id": 2, "jp_released": JP_TIME, "en_released": STALE},
+        {"id": 3, "jp_released": JP_TIME, "en_released": STALE},
+        {"id": 4, "jp_released": NOW - 500 * DAY_MS, "en_released": NOW - DAY_MS},
+    ])
+    ctx.set("jp_events", [{"id": 10, "start": JP_TIME, "end": JP_TIME + DAY_MS, "close": JP_TIME + 2 * DAY_MS}])
+    ctx.set("en_events", [{"id": 10, "start": STALE, "end": STALE, "close": STALE}])
+    ctx.set("jp_banners", [
+        {"id": 1, "sekai_id": 20, "start": JP_TIME, "end": JP_TIME + DAY_MS},
+        {"id": 2, "sekai_id": 21, "start": JP_TIME, "end": JP_TIME + DAY_MS},
+    ])
+    ctx.set("en_banners", [
+        {"id": 1, "sekai_id": 20, "start": STALE, "end": STALE},
+        {"id": 2, "sekai_id": 21, "start": STALE, "end": STALE, "type": "rerun_estimation", "rerun": [0, 0]},
+    ])
+    ctx._dirty.clear()
+    # cards 1-2, the event and both banners were estimated by the pipeline, cards 3-4 were not
+    remember_estimates("cards", ctx.get("cards")[:2] + ctx.get("cards")[3:])
+    remember_estimates("en_events", ctx.get("en_events"))
+    remember_estimates("en_banners", ctx.get("en_banners"))
+    return ctx
+
+
+def test_reprojects_untouched_future_estimates(ctx):
+    cards = ctx.get("cards")
+    cards[1]["en_released"] = STALE + 1  # set by hand after it was estimated
+
+    changes = reproject(ctx, now_ms=NOW)
+
+    assert changes == {"cards": 1, "en_banners": 2, "en_events": 1}
+    expected = project_normal([JP_TIME])[0]
+    assert [card["en_released"] for card in cards] == [expected, STALE + 1, STALE, NOW - DAY_MS]
+    assert ctx.get("en_events")[0] == dict(zip(("id", "start", "end", "close"), [10] + project_normal(
+        [JP_TIME, JP_TIME + DAY_MS, JP_TIME + 2 * DAY_MS])))
+    normal, rerun = ctx.get("en_banners")
+    assert [normal["start"], normal["end"]] == project_normal([JP_TIME, JP_TIME + DAY_MS])
+    start, end, rerun_start, rerun_end = project_rerun([(JP_TIME, JP_TIME + DAY_MS)])[0]
+    assert [rerun["start"], rerun["end"], rerun["rerun"]] == [start, end, [rerun_start, rerun_end]]
+    assert ctx._dirty == {"cards", "en_events", "en_banners"}
+
+    # the hand-set and past entries leave the ledger, the new values are recorded
+    assert load_estimates()["cards"] == {"1": {"en_released": expected}}
+    assert reproject(ctx, now_ms=NOW) == {"cards": 0, "en_banners": 0, "en_events": 0}
+
+
+def test_en_updates_are_never_overwritten(ctx):
+    # same value the estimate had, but it now comes from the EN master data
+    forget_estimates("en_events", [10])
+    forget_estimates("en_banners", [1])
+
+    changes = reproject(ctx, now_ms=NOW)
+
+    assert changes["en_events"] == 0
+    assert ctx.get("en_events")[0]["start"] == STALE
+    assert ctx.get("en_banners")[0]["start"] == STALE
+    assert changes["en_banners"] == 1
+
+
+def test_dry_run_only_reports(ctx, capsys):
+    before = {name: [dict(record) for record in ctx.get(name)] for name in ("cards", "en_events", "en_banners")}
+    ledger_before = load_estimates()
+
+    changes = reproject(ctx, now_ms=NOW, dry_run=True)
+
+    assert changes == {"cards": 2, "en_banners": 2, "en_events": 1}
+    assert {name: ctx.get(name) for name in before} == before
+    assert load_estimates() == ledger_before
+    assert not ctx._dirty
+    assert f"Would re-project cards id 1: en_released {STALE} -> " in capsys.readouterr().out
+
+
+def test_without_ledger_nothing_is_reprojected(ctx, tmp_path, monkeypatch):
+    monkeypatch.setattr(estimates, "ESTIMATES_FILE", str(tmp_path / "missing.json"))
+    assert reproject(ctx, now_ms=NOW) == {"cards": 0, "en_banners": 0, "en_events": 0}
+    assert ctx.get("cards")[0]["en_released"] == STALE
+
+
+def test_banners_sharing_a_sekai_id_keep_separate_entries(ctx):
+    # a rerun estimate of the banner with sekai_id 20
+    rerun = {"id": 3, "sekai_id": 20, "start": STALE, "end": STALE, "type": "rerun_estimation", "rerun": [0, 0]}
+    ctx.get("en_banners").append(rerun)
+    remember_estimates("en_banners", [rerun])
+
+    assert sorted(load_estimates()["en_banners"]) == ["1", "2", "3"]
+    assert reproject(ctx, now_ms=NOW)["en_banners"] == 3
+    normal = ctx.get("en_banners")[0]
+    assert [normal["start"], normal["end"]] == project_normal([JP_TIME, JP_TIME + DAY_MS])
+    assert rerun["rerun"] == list(project_rerun([(JP_TIME, JP_TIME + DAY_MS)])[0][2:])
+
+
+def test_seed_records_future_times_missing_from_en_snapshots(ctx, tmp_path, monkeypatch):
+    monkeypatch.setattr(estimates, "ESTIMATES_FILE", str(tmp_path / "fresh.json"))
+    extracted = tmp_path / "data" / "extracted"
+    extracted.mkdir(parents=True)
+    # card 2 is out in EN; there is no EN gacha snapshot, so banners are left out
+    (extracted / "en_cards_extracted.json").write_text(json.dumps([{"id": 2}]))
+    (extracted / "en_events_extracted.json").write_text(json.dumps([]))
+
+    assert seed_estimates(ctx, now_ms=NOW) == {"cards": 2, "en_events": 1, "en_banners": 0}
+    assert sorted(load_estimates()["cards"]) == ["1", "3"]
+    # seeding again keeps what is recorded
+    assert seed_estimates(ctx, now_ms=NOW) == {"cards": 0, "en_events": 0, "en_banners": 0}
+
+    assert reproject(ctx, now_ms=NOW) == {"cards": 2, "en_banners": 0, "en_events": 1}
+    assert [card["en_released"] for card in ctx.get("cards")][1:] == [STALE, project_normal([JP_TIME])[0], NOW - DAY_MS]
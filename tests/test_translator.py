@@ -0,0 +1,102 @@
+import json
+
+from scripts.transformers.translator import BATCH_SIZE, CardNameTranslator
+
+
+class FakeBackend:
+    """Upper-cases texts, failing on the given (1-based) calls"""
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.batches = []
+
+    def translate_batch(self, texts, target_lang):
+        self.batches.append(list(texts))
+        if len(self.batches) in self.fail_on:
+            raise RuntimeError("quota exceeded")
+        return [f"{text.upper()} ({target_lang})" for text in texts]
+
+
+def names(count, start=0):
+    return [f"name {i}" for i in range(start, start + count)]
+
+
+def test_batches_at_batch_size(tmp_path):
+    backend = FakeBackend()
+    translator = CardNameTranslator(backend, str(tmp_path / "translations.json"))
+
+    results = translator.translate_many(names(2 * BATCH_SIZE + 1))
+
+    assert [len(batch) for batch in backend.batches] == [BATCH_SIZE, BATCH_SIZE, 1]
+    assert results["name 0"] == "NAME 0 (EN-US)"
+    assert len(results) == 2 * BATCH_SIZE + 1
+
+
+def test_hits_and_misses(tmp_path):
+    backend = FakeBackend()
+    translator = CardNameTranslator(backend, str(tmp_path / "translations.json"))
+
+    translator.translate_many(["a", "b", "a", ""])
+    assert (translator.hits, translator.misses) == (0, 2)
+
+    assert translator.translate_many(["a", "b", "c"]) == {
+        "a": "A (EN-US)", "b": "B (EN-US)", "c": "C (EN-US)"}
+    assert (translator.hits, translator.misses) == (2, 3)
+    assert backend.batches == [["a", "b"], ["c"]]
+
+
+def test_cache_persists_between_instances(tmp_path):
+    cache_path = tmp_path / "cache" / "translations.json"
+    CardNameTranslator(FakeBackend(), str(cache_path)).translate_many(["a", "b"])
+
+    with open(cache_path, encoding="utf-8") as f:
+        assert json.load(f) == {"EN-US": {"a": "A (EN-US)", "b": "B (EN-US)"}}
+
+    backend = FakeBackend()
+    translator = CardNameTranslator(backend, str(cache_path))
+    assert translator.translate("b") == "B (EN-US)"
+    assert backend.batches == []
+    assert translator.hits == 1
+
+    # another target language does not reuse these entries
+    other = CardNameTranslator(backend, str(cache_path), target_lang="EN-GB")
+    assert other.translate("b") == "B (EN-GB)"
+    assert other.misses == 1
+
+
+def test_backend_failure_does_not_poison_cache(tmp_path):
+    cache_path = tmp_path / "translations.json"
+    failing = FakeBackend(fail_on={2})
+    translator = CardNameTranslator(failing, str(cache_path))
+
+    results = translator.translate_many(names(2 * BATCH_SIZE))
+
+    # the batch before the failure is kept, the failed one is neither returned nor cached
+    assert sorted(results) == sorted(names(BATCH_SIZE))
+    with open(cache_path, encoding="utf-8") as f:
+        assert sorted(json.load(f)["EN-US"]) == sorted(names(BATCH_SIZE))
+
+    backend = FakeBackend()
+    retry = CardNameTranslator(backend, str(cache_path))
+    results = retry.translate_many(names(2 * BATCH_SIZE))
+    assert backend.batches == [names(BATCH_SIZE, start=BATCH_SIZE)]
+    assert len(results) == 2 * BATCH_SIZE
+    assert (retry.hits, retry.misses) == (BATCH_SIZE, BATCH_SIZE)
+
+
+def test_missing_backend_leaves_cache_untouched(tmp_path):
+    cache_path = tmp_path / "translations.json"
+    translator = CardNameTranslator(None, str(cache_path))
+
+    assert translator.translate("a") == ""
+    assert not cache_path.exists()
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = CardNameTranslator(FakeBackend(), str(cache_dir / "translations.json"))
+    second = CardNameTranslator(FakeBackend(), str(cache_dir / "translations.json"))
+    first.translate_many(["a"])
+    second.translate_many(["b"])
+
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["translations.json"]